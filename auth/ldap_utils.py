@@ -1,32 +1,17 @@
 import logging
-from ldap3 import Server, Connection, ALL, NTLM, SUBTREE
 from config import LDAP_SERVER, LDAP_DOMAIN, GROUP_DN, BASE_DN
-import os
-from datetime import datetime
-
-# ---------- Diretórios de logs ----------
-LOGIN_LOG_DIR = "logs/login"
-os.makedirs(LOGIN_LOG_DIR, exist_ok=True)
+from services.metrics import medir
 
 # ---------- Logger de login diário ----------
-hoje = datetime.now().strftime("%Y%m%d")
+# Handlers registrados em logger_config.configurar_logs() no startup da aplicação
 login_logger = logging.getLogger("login")
-login_logger.setLevel(logging.INFO)
-
-login_handler = logging.FileHandler(
-    filename=os.path.join(LOGIN_LOG_DIR, f"login_{hoje}.log"),
-    encoding="utf-8"
-)
-login_handler.setFormatter(
-    logging.Formatter('%(asctime)s | %(levelname)s | %(message)s', datefmt='%d/%m/%Y %H:%M:%S')
-)
-login_logger.addHandler(login_handler)
-login_logger.addHandler(logging.StreamHandler())  # também imprime no console
 
 # ---------- LDAP Utilities ----------
 
 def autenticar_ldap(usuario: str, senha: str) -> bool:
     """Faz bind no Active Directory usando NTLM."""
+    from ldap3 import Server, Connection, ALL, NTLM
+
     try:
         server = Server(LDAP_SERVER, get_info=ALL)
         conn = Connection(
@@ -37,7 +22,10 @@ def autenticar_ldap(usuario: str, senha: str) -> bool:
             receive_timeout=10
         )
 
-        if conn.bind():
+        with medir("ldap_bind"):
+            bind_ok = conn.bind()
+
+        if bind_ok:
             login_logger.info(f"✅ Bind realizado com sucesso para '{usuario}'")
             return True
         else:
@@ -51,6 +39,8 @@ def autenticar_ldap(usuario: str, senha: str) -> bool:
 
 def usuario_tem_acesso(usuario: str, senha: str) -> bool:
     """Verifica se o usuário pertence ao grupo específico definido em GROUP_DN."""
+    from ldap3 import Server, Connection, ALL, NTLM, SUBTREE
+
     try:
         server = Server(LDAP_SERVER, get_info=ALL)
         conn = Connection(
@@ -61,7 +51,10 @@ def usuario_tem_acesso(usuario: str, senha: str) -> bool:
             receive_timeout=10
         )
 
-        if not conn.bind():
+        with medir("ldap_bind"):
+            bind_ok = conn.bind()
+
+        if not bind_ok:
             login_logger.warning(f"❌ Bind falhou para '{usuario}': {conn.result}")
             return False
 
@@ -69,12 +62,13 @@ def usuario_tem_acesso(usuario: str, senha: str) -> bool:
 
         # Busca do usuário no Base DN e verificação de grupo
         search_filter = f"(&(sAMAccountName={usuario})(memberOf={GROUP_DN}))"
-        conn.search(
-            search_base=BASE_DN,
-            search_filter=search_filter,
-            search_scope=SUBTREE,
-            attributes=["distinguishedName", "memberOf"]
-        )
+        with medir("ldap_grupo"):
+            conn.search(
+                search_base=BASE_DN,
+                search_filter=search_filter,
+                search_scope=SUBTREE,
+                attributes=["distinguishedName", "memberOf"]
+            )
 
         if conn.entries:
             login_logger.info(f"✅ Usuário '{usuario}' pertence ao grupo '{GROUP_DN}'")
@@ -0,0 +1,180 @@
+"""
+Teste de carga com usuários concorrentes contra a aplicação FastAPI em execução.
+
+Cada usuário virtual repete, em sequência, as rotas escolhidas em --rotas
+(/login, /api/produtos e /patrimonio/upload) e o script reporta p50/p99,
+erros e vazão por rota.
+
+A aplicação deve estar apontada para o IXC falso e para o banco local, para que
+os uploads não alterem a produção:
+
+    python -m benchmarks.fake_ixc --porta 8099 &
+    API_BASE_URL=http://127.0.0.1:8099/webservice/v1/patrimonio \\
+    DB_HOST=127.0.0.1 DB_USER=root DB_PASS=bench DB_NAME=bench \\
+        uvicorn main:app --port 8000 &
+    BENCH_USUARIO=usuario.teste BENCH_SENHA=... \\
+        python -m benchmarks.carga --url http://127.0.0.1:8000 --usuarios 20 --iteracoes 10
+
+O /login autentica no LDAP configurado na aplicação; use um usuário de teste.
+"""
+import argparse
+import math
+import os
+import sys
+import threading
+import time
+
+from benchmarks.planilhas import gerar_planilha_bytes
+
+ROTAS = ("login", "produtos", "upload")
+
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil pelo método nearest-rank (valores já ordenados)."""
+    if not valores:
+        return 0.0
+    posicao = max(0, math.ceil(p / 100 * len(valores)) - 1)
+    return valores[posicao]
+
+
+class UsuarioVirtual(threading.Thread):
+    """Executa as rotas pedidas em laço e registra a latência de cada chamada."""
+
+    def __init__(self, numero: int, args, planilhas: list, amostras: dict, trava: threading.Lock):
+        super().__init__(daemon=True)
+        self.numero = numero
+        self.args = args
+        self.planilhas = planilhas
+        self.amostras = amostras
+        self.trava = trava
+        self.token = None
+
+    def _registrar(self, rota: str, inicio: float, ok: bool):
+        duracao = time.perf_counter() - inicio
+        if rota not in self.amostras:
+            return
+        with self.trava:
+            self.amostras[rota]["latencias"].append(duracao)
+            if not ok:
+                self.amostras[rota]["erros"] += 1
+
+    def _login(self, sessao):
+        inicio = time.perf_counter()
+        resp = sessao.post(
+            f"{self.args.url}/login",
+            data={"username": self.args.usuario, "password": self.args.senha},
+            allow_redirects=False, timeout=self.args.timeout
+        )
+        # Login bem-sucedido responde 303 para /choose com o cookie access_token
+        ok = resp.status_code == 303 and "access_token" in resp.cookies
+        self._registrar("login", inicio, ok)
+        if ok:
+            self.token = resp.cookies["access_token"]
+
+    def _produtos(self, sessao):
+        inicio = time.perf_counter()
+        resp = sessao.get(
+            f"{self.args.url}/api/produtos",
+            cookies={"access_token": self.token or ""},
+            allow_redirects=False, timeout=self.args.timeout
+        )
+        self._registrar("produtos", inicio, resp.status_code == 200)
+
+    def _upload(self, sessao, iteracao: int):
+        inicio = time.perf_counter()
+        resp = sessao.post(
+            f"{self.args.url}/patrimonio/upload",
+            data={"id_produto": self.args.id_produto},
+            files={"file": (f"carga_{self.numero}_{iteracao}.xlsx", self.planilhas[iteracao])},
+            cookies={"access_token": self.token or ""},
+            allow_redirects=False, timeout=self.args.timeout
+        )
+        self._registrar("upload", inicio, resp.status_code == 200)
+
+    def run(self):
+        import requests
+
+        sessao = requests.Session()
+        acoes = {
+            "login": lambda sessao, iteracao: self._login(sessao),
+            "produtos": lambda sessao, iteracao: self._produtos(sessao),
+            "upload": self._upload,
+        }
+
+        # O cookie é obrigatório para as demais rotas, mesmo que /login não seja medido
+        if "login" not in self.args.rotas:
+            self._login(sessao)
+
+        for iteracao in range(self.args.iteracoes):
+            for rota in self.args.rotas:
+                try:
+                    acoes[rota](sessao, iteracao)
+                except Exception:
+                    with self.trava:
+                        self.amostras[rota]["erros"] += 1
+                        self.amostras[rota]["latencias"].append(self.args.timeout)
+
+
+def imprimir_relatorio(amostras: dict, duracao_total: float):
+    print()
+    print(f"{'rota':<10} | {'req':>6} | {'erros':>6} | {'p50 (ms)':>9} | {'p99 (ms)':>9} | {'req/s':>7}")
+    print("-" * 62)
+    for rota, dados in amostras.items():
+        latencias = sorted(dados["latencias"])
+        if not latencias:
+            continue
+        print(f"{rota:<10} | {len(latencias):>6} | {dados['erros']:>6} | "
+              f"{percentil(latencias, 50) * 1000:>9.1f} | {percentil(latencias, 99) * 1000:>9.1f} | "
+              f"{len(latencias) / duracao_total:>7.1f}")
+    print(f"\nDuração total: {duracao_total:.1f}s")
+
+
+def gerar_planilhas_usuario(numero: int, args) -> list:
+    """
+    Uma planilha diferente por iteração do usuário, geradas antes da medição.
+    Reenviar a mesma planilha seria barrado pela validação de duplicidade (MAC/série
+    já cadastrados) e a carga mediria só o caminho de rejeição. O `inicio` é único
+    por (usuário, iteração), então nenhum MAC/série se repete entre usuários.
+    """
+    if "upload" not in args.rotas:
+        return []
+    n = args.linhas_upload
+    return [
+        gerar_planilha_bytes(n, prefixo=f"CARGA{numero}", inicio=(iteracao * args.usuarios + numero) * n)
+        for iteracao in range(args.iteracoes)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API de patrimônio")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--usuarios", type=int, default=10, help="Usuários concorrentes")
+    parser.add_argument("--iteracoes", type=int, default=5, help="Iterações por usuário")
+    parser.add_argument("--rotas", nargs="+", choices=ROTAS, default=list(ROTAS))
+    parser.add_argument("--id-produto", default="1")
+    parser.add_argument("--linhas-upload", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    args.usuario = os.getenv("BENCH_USUARIO")
+    args.senha = os.getenv("BENCH_SENHA")
+    if not args.usuario or not args.senha:
+        sys.exit("Defina BENCH_USUARIO e BENCH_SENHA com um usuário de teste do LDAP")
+
+    amostras = {rota: {"latencias": [], "erros": 0} for rota in args.rotas}
+    trava = threading.Lock()
+
+    usuarios = [UsuarioVirtual(n, args, gerar_planilhas_usuario(n, args), amostras, trava)
+                for n in range(args.usuarios)]
+    inicio = time.perf_counter()
+    for usuario in usuarios:
+        usuario.start()
+    for usuario in usuarios:
+        usuario.join()
+    duracao_total = time.perf_counter() - inicio
+
+    imprimir_relatorio(amostras, duracao_total)
+
+
+if __name__ == "__main__":
+    main()
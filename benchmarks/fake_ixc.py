@@ -0,0 +1,169 @@
+"""
+Servidor HTTP local que imita o webservice de patrimônio do IXC.
+
+Atende às duas chamadas feitas pelo pipeline de upload:
+
+- GET  <base>            (header "ixcsoft: listar") -> lista de patrimônios livres
+- PUT  <base>/<id>       -> {"type": "success", ...}
+
+O estoque é gerado sob demanda (nenhum registro é guardado em memória) e respeita
+"rp"/"page" como o IXC real. Os PUTs não alteram estado, então a mesma planilha
+pode ser reenviada quantas vezes for preciso.
+
+Uso isolado (ex.: para apontar o uvicorn no teste de carga):
+
+    python -m benchmarks.fake_ixc --porta 8099 --estoque 200000
+    API_BASE_URL=http://127.0.0.1:8099/webservice/v1/patrimonio uvicorn main:app
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CAMINHO_BASE = "/webservice/v1/patrimonio"
+
+
+def registros_estoque(id_produto: int, inicio: int, fim: int) -> list:
+    """Patrimônios livres [inicio, fim) do produto, como o GET do IXC falso os devolve."""
+    base_id = id_produto * 10_000_000
+    return [
+        {
+            "id": str(base_id + n),
+            "id_produto": str(id_produto),
+            "situacao": "1",
+            "id_mac": "",
+            "serial_fornecedor": "",
+        }
+        for n in range(inicio, fim)
+    ]
+
+
+class _IXCHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Preenchidos por FakeIXC
+    estoque = 0
+    latencia = 0.0
+    contadores = None
+    trava = None
+
+    def log_message(self, format, *args):
+        # Silencia o log padrão do http.server (poluiria as medições)
+        pass
+
+    def _ler_corpo(self) -> bytes:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def _responder(self, status: int, corpo: dict):
+        # Sem espaços, como o IXC real: processar_arquivo procura o texto exato '"type":"success"'
+        dados = json.dumps(corpo, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _contar(self, chave: str):
+        with self.trava:
+            self.contadores[chave] = self.contadores.get(chave, 0) + 1
+
+    def do_GET(self):
+        corpo = self._ler_corpo()
+        if self.latencia:
+            time.sleep(self.latencia)
+        self._contar("get")
+
+        try:
+            payload = json.loads(corpo or b"{}")
+        except ValueError:
+            self._responder(400, {"type": "error", "message": "JSON inválido"})
+            return
+
+        id_produto = int(payload.get("query") or 0)
+        rp = int(payload.get("rp") or 20)
+        pagina = int(payload.get("page") or 1)
+
+        inicio = (pagina - 1) * rp
+        fim = min(inicio + rp, self.estoque)
+        registros = registros_estoque(id_produto, inicio, fim)
+        self._responder(200, {"page": str(pagina), "total": str(self.estoque), "registros": registros})
+
+    def do_PUT(self):
+        self._ler_corpo()
+        if self.latencia:
+            time.sleep(self.latencia)
+        self._contar("put")
+
+        patrimonio_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        self._responder(200, {
+            "type": "success",
+            "message": "Registro atualizado com sucesso!",
+            "id": patrimonio_id,
+        })
+
+
+class FakeIXC:
+    """Sobe o servidor falso em uma thread; use como context manager."""
+
+    def __init__(self, porta: int = 0, estoque: int = 200_000, latencia_ms: float = 0.0):
+        handler = type("IXCHandler", (_IXCHandler,), {
+            "estoque": estoque,
+            "latencia": latencia_ms / 1000.0,
+            "contadores": {},
+            "trava": threading.Lock(),
+        })
+        self._handler = handler
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", porta), handler)
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}{CAMINHO_BASE}"
+
+    @property
+    def contadores(self) -> dict:
+        return dict(self._handler.contadores)
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor IXC falso para benchmarks")
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--estoque", type=int, default=200_000,
+                        help="Quantidade de patrimônios livres por produto")
+    parser.add_argument("--latencia-ms", type=float, default=0.0,
+                        help="Latência artificial por requisição")
+    args = parser.parse_args()
+
+    servidor = FakeIXC(args.porta, args.estoque, args.latencia_ms)
+    print(f"IXC falso escutando em {servidor.url} (Ctrl+C para sair)")
+    servidor.iniciar()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.parar()
+
+
+if __name__ == "__main__":
+    main()
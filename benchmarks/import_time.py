@@ -0,0 +1,136 @@
+"""
+Benchmark de inicialização: quanto custa importar main.py e subir o app
+(import + lifespan), que é o que cada worker do uvicorn/gunicorn paga no boot.
+
+Cada medição roda em um interpretador novo e é cronometrada dentro dele, então
+a subida do Python não entra na conta (ela é medida à parte, só como referência).
+Com --comparar, a mesma medição roda em um
+git worktree temporário da referência informada, para comparar antes/depois:
+
+    python -m benchmarks.import_time --execucoes 10 --comparar <commit-anterior>
+    python -m benchmarks.import_time --comparar HEAD~1 --importtime
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS_PESADOS = ("pandas", "numpy", "mysql.connector", "ldap3", "requests", "openpyxl")
+
+SCRIPT_BOOT = f"""
+import asyncio, json, sys, time
+inicio = time.perf_counter()
+import main
+fim_import = time.perf_counter()
+
+async def subir():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(subir())
+fim_boot = time.perf_counter()
+print(json.dumps({{
+    "import": fim_import - inicio,
+    "boot": fim_boot - inicio,
+    "pesados": [m for m in {MODULOS_PESADOS!r} if m in sys.modules],
+}}))
+"""
+
+
+def _executar(cwd: str, codigo: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", codigo], cwd=cwd, capture_output=True, text=True)
+
+
+def medir(cwd: str, execucoes: int) -> dict:
+    """Mede import e boot do app em `cwd` (medianas de `execucoes` interpretadores novos)."""
+    import time
+
+    vazio = []
+    for _ in range(execucoes):
+        inicio = time.perf_counter()
+        _executar(cwd, "pass")
+        vazio.append(time.perf_counter() - inicio)
+
+    imports, boots, pesados = [], [], []
+    for _ in range(execucoes):
+        proc = _executar(cwd, SCRIPT_BOOT)
+        if proc.returncode != 0:
+            sys.exit(f"Falha ao importar main em {cwd}:\n{proc.stderr}")
+        dados = json.loads(proc.stdout.strip().splitlines()[-1])
+        imports.append(dados["import"])
+        boots.append(dados["boot"])
+        pesados = dados["pesados"]
+
+    return {
+        "interpretador_ms": statistics.median(vazio) * 1000,
+        "import_ms": statistics.median(imports) * 1000,
+        "import_min_ms": min(imports) * 1000,
+        "boot_ms": statistics.median(boots) * 1000,
+        "pesados_carregados": pesados,
+    }
+
+
+def maiores_imports(cwd: str, quantidade: int = 10) -> list:
+    """Top imports de primeiro nível por tempo acumulado (python -X importtime)."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                          cwd=cwd, capture_output=True, text=True)
+    itens = []
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, modulo = linha[len("import time:"):].split("|")
+        # Módulos de primeiro nível não têm indentação extra
+        if not modulo.startswith("  "):
+            itens.append((int(acumulado) / 1000, modulo.strip()))
+    return sorted(itens, reverse=True)[:quantidade]
+
+
+def imprimir(titulo: str, medicao: dict, top: list = None):
+    print(f"\n== {titulo}")
+    print(f"  interpretador vazio : {medicao['interpretador_ms']:8.1f} ms")
+    print(f"  import main         : {medicao['import_ms']:8.1f} ms (mín. {medicao['import_min_ms']:.1f})")
+    print(f"  import + lifespan   : {medicao['boot_ms']:8.1f} ms")
+    print(f"  módulos pesados     : {', '.join(medicao['pesados_carregados']) or 'nenhum'}")
+    for ms, modulo in top or []:
+        print(f"    {ms:8.1f} ms  {modulo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de import/boot da aplicação")
+    parser.add_argument("--execucoes", type=int, default=5)
+    parser.add_argument("--comparar", metavar="REF", help="Referência git para comparar (ex.: HEAD~1)")
+    parser.add_argument("--importtime", action="store_true",
+                        help="Lista os imports de primeiro nível mais caros")
+    args = parser.parse_args()
+
+    atual = medir(RAIZ_PROJETO, args.execucoes)
+    imprimir("Árvore atual", atual, maiores_imports(RAIZ_PROJETO) if args.importtime else None)
+
+    if not args.comparar:
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    worktree = os.path.join(tmp_dir, "ref")
+    subprocess.run(["git", "worktree", "add", "--detach", worktree, args.comparar],
+                   cwd=RAIZ_PROJETO, check=True, capture_output=True)
+    try:
+        referencia = medir(worktree, args.execucoes)
+        imprimir(f"Referência {args.comparar}", referencia,
+                 maiores_imports(worktree) if args.importtime else None)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", worktree],
+                       cwd=RAIZ_PROJETO, capture_output=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    ganho = referencia["boot_ms"] - atual["boot_ms"]
+    print(f"\nBoot do worker: {referencia['boot_ms']:.1f} ms -> {atual['boot_ms']:.1f} ms "
+          f"({ganho:+.1f} ms, {ganho / referencia['boot_ms'] * 100 if referencia['boot_ms'] else 0:.0f}% menor)")
+
+
+if __name__ == "__main__":
+    main()
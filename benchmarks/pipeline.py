@@ -0,0 +1,296 @@
+"""
+Benchmark do pipeline de upload: validar_planilha -> validar_estoque -> processar_arquivo.
+
+Para cada tamanho de planilha pedido, gera uma planilha sintética de MAC/série,
+executa as três etapas contra o IXC falso (benchmarks/fake_ixc.py) e um MySQL
+local, e reporta tempo, vazão (linhas/s) e pico de RSS por etapa.
+
+Cada tamanho roda em um subprocesso próprio, para que o pico de RSS de uma rodada
+não contamine a seguinte.
+
+O banco usado é SEMPRE o definido pelas variáveis BENCH_DB_* (nunca o DB_* do .env),
+e o API_BASE_URL é sempre o do IXC falso, então nenhuma escrita chega à produção:
+
+    docker run -d -p 3306:3306 -e MYSQL_ROOT_PASSWORD=bench -e MYSQL_DATABASE=bench mysql:8
+    export BENCH_DB_HOST=127.0.0.1 BENCH_DB_PORT=3306 BENCH_DB_USER=root \\
+           BENCH_DB_PASS=bench BENCH_DB_NAME=bench
+    python -m benchmarks.pipeline --seed-db 100000 --linhas 10 1000 10000 100000
+
+O GET de estoque pede rp=1000, então acima de 1000 linhas a maioria delas fica
+"Sem patrimônio disponível" sem PUT. A vazão de processar_arquivo é reportada em
+PUTs realmente recebidos pelo IXC falso por segundo; com --estoque-completo, o
+processamento recebe um patrimônio livre para cada linha e o loop de PUTs é
+exercitado por inteiro.
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_ixc import FakeIXC, registros_estoque
+from benchmarks.planilhas import gerar_linhas, gerar_planilha
+
+RAIZ_PROJETO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOSTS_LOCAIS = ("localhost", "127.0.0.1", "::1")
+
+
+# ----------------- BANCO LOCAL -----------------
+def db_config_bench() -> dict:
+    """Lê a configuração do banco de benchmark das variáveis BENCH_DB_*."""
+    faltando = [v for v in ("BENCH_DB_HOST", "BENCH_DB_USER", "BENCH_DB_NAME") if not os.getenv(v)]
+    if faltando:
+        sys.exit(f"Defina as variáveis {', '.join(faltando)} apontando para um MySQL local")
+
+    return {
+        "host": os.getenv("BENCH_DB_HOST"),
+        "port": os.getenv("BENCH_DB_PORT", "3306"),
+        "user": os.getenv("BENCH_DB_USER"),
+        "password": os.getenv("BENCH_DB_PASS", ""),
+        "database": os.getenv("BENCH_DB_NAME"),
+    }
+
+
+def semear_banco(db_config: dict, qtd_patrimonios: int, qtd_produtos: int = 500):
+    """
+    Cria as tabelas usadas pela aplicação (se não existirem) e insere
+    `qtd_patrimonios` patrimônios já cadastrados, para que a varredura de
+    duplicidade tenha um volume realista.
+    """
+    import mysql.connector
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS patrimonio (
+            id INT PRIMARY KEY AUTO_INCREMENT,
+            id_produto INT NOT NULL,
+            situacao CHAR(1) DEFAULT '1',
+            id_mac VARCHAR(64),
+            serial_fornecedor VARCHAR(128)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INT PRIMARY KEY,
+            descricao VARCHAR(255),
+            tipo CHAR(1) DEFAULT 'P'
+        )
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM produtos")
+    if cursor.fetchone()[0] == 0:
+        cursor.executemany(
+            "INSERT INTO produtos (id, descricao, tipo) VALUES (%s, %s, 'P')",
+            [(i, f"PRODUTO BENCH {i}") for i in range(1, qtd_produtos + 1)]
+        )
+
+    cursor.execute("DELETE FROM patrimonio WHERE serial_fornecedor LIKE 'SEED-%'")
+    lote = []
+    for linha in gerar_linhas(qtd_patrimonios, prefixo="SEED"):
+        lote.append((1 + len(lote) % qtd_produtos, linha["mac"], linha["serie"]))
+        if len(lote) >= 5000:
+            cursor.executemany(
+                "INSERT INTO patrimonio (id_produto, id_mac, serial_fornecedor) VALUES (%s, %s, %s)", lote)
+            lote = []
+    if lote:
+        cursor.executemany(
+            "INSERT INTO patrimonio (id_produto, id_mac, serial_fornecedor) VALUES (%s, %s, %s)", lote)
+
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+# ----------------- EXECUÇÃO DE UMA RODADA (SUBPROCESSO) -----------------
+def _pico_rss_mb() -> float:
+    import resource
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def executar_rodada(qtd_linhas: int, id_produto: str, log_nivel: str, estoque_completo: bool = False) -> dict:
+    """
+    Executa as três etapas do pipeline e devolve as medições de cada uma.
+    Com estoque_completo, processar_arquivo recebe um patrimônio livre por linha
+    (no formato do IXC falso) em vez de só a primeira página do GET.
+    """
+    from services.validations import validar_planilha, validar_estoque
+    from services.process import processar_arquivo
+
+    tmp_dir = tempfile.mkdtemp()
+    caminho = os.path.join(tmp_dir, f"bench_{qtd_linhas}.xlsx")
+    gerar_planilha(caminho, qtd_linhas)
+
+    # Log em arquivo, como em produção, mas fora de logs/sistema
+    logger = logging.getLogger("bench")
+    logger.setLevel(log_nivel)
+    logger.propagate = False
+    handler = logging.FileHandler(os.path.join(tmp_dir, "bench.log"), encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
+    logger.addHandler(handler)
+
+    medicoes = {"linhas": qtd_linhas, "etapas": [], "rss_inicial_mb": round(_pico_rss_mb(), 1)}
+
+    def medir(nome, funcao, *args):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        duracao = time.perf_counter() - inicio
+        medicoes["etapas"].append({
+            "etapa": nome,
+            "segundos": round(duracao, 4),
+            "linhas_por_segundo": round(qtd_linhas / duracao, 1) if duracao else None,
+            "pico_rss_mb": round(_pico_rss_mb(), 1),
+            "status": resultado.get("status"),
+        })
+        return resultado
+
+    try:
+        validacao = medir("validar_planilha", validar_planilha, caminho, logger)
+        if validacao["status"] != "sucesso":
+            medicoes["erro"] = validacao["detalhes"][:3]
+            return medicoes
+
+        df = validacao["dados"]
+        estoque = medir("validar_estoque", validar_estoque, df, id_produto, logger)
+        if estoque["status"] != "sucesso":
+            medicoes["erro"] = estoque["detalhes"][:3]
+            return medicoes
+
+        patrimonios = estoque["patrimonios"]
+        if estoque_completo and len(patrimonios) < qtd_linhas:
+            patrimonios = patrimonios + registros_estoque(int(id_produto), len(patrimonios), qtd_linhas)
+
+        resultado = medir("processar_arquivo", processar_arquivo, df, patrimonios, logger)
+        sucessos = sum(1 for r in resultado["detalhes"] if r["status"] == "sucesso")
+        medicoes["resultado"] = {"sucesso": sucessos, "erro": len(resultado["detalhes"]) - sucessos}
+        return medicoes
+    finally:
+        handler.close()
+        try:
+            os.remove(caminho)
+            os.remove(os.path.join(tmp_dir, "bench.log"))
+            os.rmdir(tmp_dir)
+        except Exception:
+            pass
+
+
+# ----------------- ORQUESTRAÇÃO -----------------
+def _env_rodada(db_config: dict, url_ixc: str) -> dict:
+    """Ambiente do subprocesso: banco e IXC locais têm precedência sobre o .env."""
+    env = dict(os.environ)
+    env.update({
+        "API_BASE_URL": url_ixc,
+        "IXC_SESSION": "",
+        "TOKEN": env.get("TOKEN") or "bench:bench",
+        "DB_HOST": db_config["host"],
+        "DB_PORT": str(db_config["port"]),
+        "DB_USER": db_config["user"],
+        "DB_PASS": db_config["password"],
+        "DB_NAME": db_config["database"],
+    })
+    return env
+
+
+def imprimir_relatorio(rodadas: list):
+    print()
+    print(f"{'linhas':>8} | {'etapa':<18} | {'segundos':>9} | {'linhas/s':>10} | {'PUTs/s':>10} | "
+          f"{'pico RSS (MB)':>13}")
+    print("-" * 83)
+    for rodada in rodadas:
+        for etapa in rodada["etapas"]:
+            lps = etapa["linhas_por_segundo"]
+            pps = f"{etapa['puts_por_segundo']:>10.1f}" if etapa.get("puts_por_segundo") is not None else f"{'-':>10}"
+            print(f"{rodada['linhas']:>8} | {etapa['etapa']:<18} | {etapa['segundos']:>9.3f} | "
+                  f"{(lps if lps is not None else 0):>10.1f} | {pps} | {etapa['pico_rss_mb']:>13.1f}")
+        total = sum(e["segundos"] for e in rodada["etapas"])
+        print(f"{rodada['linhas']:>8} | {'TOTAL':<18} | {total:>9.3f} | "
+              f"{(rodada['linhas'] / total if total else 0):>10.1f} |")
+        if "resultado" in rodada:
+            print(f"{'':>8} | resultado: {rodada['resultado']}, PUTs enviados: {rodada.get('puts')}")
+            if rodada.get("puts") is not None and rodada["puts"] < rodada["linhas"]:
+                print(f"{'':>8} | ⚠ só {rodada['puts']} de {rodada['linhas']} linhas chegaram a um PUT "
+                      f"(estoque limitado pelo rp do GET); use --estoque-completo")
+        if "erro" in rodada:
+            print(f"{'':>8} | erro: {rodada['erro']}")
+        print("-" * 83)
+
+
+def _registrar_puts(rodada: dict, puts: int):
+    """Vazão do loop de PUTs pelo que o IXC falso realmente recebeu, não por linha da planilha."""
+    rodada["puts"] = puts
+    for etapa in rodada["etapas"]:
+        if etapa["etapa"] == "processar_arquivo":
+            etapa["puts_por_segundo"] = round(puts / etapa["segundos"], 1) if etapa["segundos"] else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de upload de MAC/série")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+    parser.add_argument("--id-produto", default="1")
+    parser.add_argument("--estoque", type=int, default=200_000,
+                        help="Patrimônios livres informados pelo IXC falso")
+    parser.add_argument("--latencia-ms", type=float, default=0.0,
+                        help="Latência artificial do IXC falso por requisição")
+    parser.add_argument("--seed-db", type=int, default=0,
+                        help="Insere N patrimônios já cadastrados antes de medir")
+    parser.add_argument("--estoque-completo", action="store_true",
+                        help="Entrega um patrimônio livre por linha ao processar_arquivo (sem o limite do rp)")
+    parser.add_argument("--log-nivel", default="INFO")
+    parser.add_argument("--json", dest="saida_json", help="Grava as medições neste arquivo")
+    parser.add_argument("--permitir-db-remoto", action="store_true",
+                        help="Permite BENCH_DB_HOST fora de localhost")
+    parser.add_argument("--executar-rodada", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Subprocesso: executa uma única rodada e devolve o JSON na última linha
+    if args.executar_rodada is not None:
+        print(json.dumps(executar_rodada(args.executar_rodada, args.id_produto, args.log_nivel,
+                                         args.estoque_completo)))
+        return
+
+    db_config = db_config_bench()
+    if db_config["host"] not in HOSTS_LOCAIS and not args.permitir_db_remoto:
+        sys.exit(f"BENCH_DB_HOST={db_config['host']} não é local; use --permitir-db-remoto se for intencional")
+
+    if args.seed_db:
+        print(f"Semeando {args.seed_db} patrimônios no banco local...")
+        semear_banco(db_config, args.seed_db)
+
+    rodadas = []
+    with FakeIXC(estoque=args.estoque, latencia_ms=args.latencia_ms) as ixc:
+        env = _env_rodada(db_config, ixc.url)
+        for qtd in args.linhas:
+            print(f"Rodada com {qtd} linhas...")
+            puts_antes = ixc.contadores.get("put", 0)
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.pipeline",
+                 "--executar-rodada", str(qtd),
+                 "--id-produto", args.id_produto,
+                 "--log-nivel", args.log_nivel]
+                + (["--estoque-completo"] if args.estoque_completo else []),
+                env=env, cwd=RAIZ_PROJETO, capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(proc.stderr, file=sys.stderr)
+                sys.exit(f"Rodada com {qtd} linhas falhou")
+            rodada = json.loads(proc.stdout.strip().splitlines()[-1])
+            _registrar_puts(rodada, ixc.contadores.get("put", 0) - puts_antes)
+            rodadas.append(rodada)
+        chamadas_ixc = ixc.contadores
+
+    imprimir_relatorio(rodadas)
+    print(f"Chamadas ao IXC falso: {chamadas_ixc}")
+
+    if args.saida_json:
+        with open(args.saida_json, "w", encoding="utf-8") as f:
+            json.dump({"rodadas": rodadas, "chamadas_ixc": chamadas_ixc}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
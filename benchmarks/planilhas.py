@@ -0,0 +1,44 @@
+"""
+Geração de planilhas sintéticas de MAC/série para os benchmarks.
+
+As planilhas seguem o mesmo layout do modelo em static/doc/mac_serie.xlsx
+(colunas "mac" e "serie") e são determinísticas a partir do prefixo, para que
+rodadas diferentes sejam comparáveis.
+"""
+import io
+import zlib
+
+
+def gerar_mac(numero: int, prefixo: int = 0xAA) -> str:
+    """Gera um MAC no formato AA:BB:CC:DD:EE:FF a partir de um número sequencial."""
+    valor = (prefixo << 40) | (numero & 0xFFFFFFFFFF)
+    texto = f"{valor:012X}"
+    return ":".join(texto[i:i + 2] for i in range(0, 12, 2))
+
+
+def gerar_linhas(qtd_linhas: int, prefixo: str = "BENCH", inicio: int = 0) -> list:
+    """Retorna a lista de linhas {mac, serie} sem duplicidades internas."""
+    prefixo_mac = 0xAA if prefixo == "BENCH" else (zlib.crc32(prefixo.encode()) & 0xFF) | 0x02
+    return [
+        {"mac": gerar_mac(n, prefixo_mac), "serie": f"{prefixo}-{n:08d}"}
+        for n in range(inicio, inicio + qtd_linhas)
+    ]
+
+
+def gerar_planilha(destino, qtd_linhas: int, prefixo: str = "BENCH", inicio: int = 0):
+    """
+    Grava uma planilha .xlsx com `qtd_linhas` linhas em `destino`
+    (caminho ou objeto file-like).
+    """
+    import pandas as pd
+
+    df = pd.DataFrame(gerar_linhas(qtd_linhas, prefixo, inicio), columns=["mac", "serie"])
+    df.to_excel(destino, index=False)
+    return destino
+
+
+def gerar_planilha_bytes(qtd_linhas: int, prefixo: str = "BENCH", inicio: int = 0) -> bytes:
+    """Mesma planilha de `gerar_planilha`, mas em memória (usada no teste de carga)."""
+    buffer = io.BytesIO()
+    gerar_planilha(buffer, qtd_linhas, prefixo, inicio)
+    return buffer.getvalue()
@@ -10,6 +10,28 @@ IXC_SESSION = os.getenv("IXC_SESSION") or ""
 TOKEN = os.getenv("TOKEN")
 LOG_FILE = os.getenv("LOG_FILE", "logs/app.log")
 
+# Consultas de estoque simultâneas ao IXC em uploads de lote
+ESTOQUE_PARALELISMO = int(os.getenv("ESTOQUE_PARALELISMO", 8))
+
+# Tempo que um plano de dry-run fica disponível para confirmação
+PLANO_TTL_SEGUNDOS = int(os.getenv("PLANO_TTL_SEGUNDOS", 600))
+
+# Header Server-Timing com a duração de cada etapa da requisição (desligado por padrão)
+METRICS_TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0").lower() in ("1", "true", "sim")
+
+# Vários workers (gunicorn.conf.py): caches, planos e métricas ficam em um SQLite
+# local compartilhado entre os processos em vez da memória de cada um
+MULTIPROCESSO = os.getenv("MULTIPROCESSO", "0").lower() in ("1", "true", "sim")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite" if MULTIPROCESSO else "memoria")
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "cache/compartilhado.sqlite3")
+PRODUTOS_CACHE_TTL = int(os.getenv("PRODUTOS_CACHE_TTL", 300))
+# Índice de MAC/série já cadastrados (só no backend sqlite; 0 desliga)
+DUPLICIDADE_CACHE_TTL = int(os.getenv("DUPLICIDADE_CACHE_TTL", 60))
+METRICS_PUBLICAR_SEGUNDOS = float(os.getenv("METRICS_PUBLICAR_SEGUNDOS", 5))
+
+# Por quantos dias o resultado linha a linha de cada upload fica disponível para exportação
+JOBS_RETENCAO_DIAS = int(os.getenv("JOBS_RETENCAO_DIAS", 35))
+
 def basic_auth_header():
     token = f"{TOKEN}".encode("utf-8")
     return base64.b64encode(token).decode("utf-8")
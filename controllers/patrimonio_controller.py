@@ -1,20 +1,283 @@
-from services.validations import validar_planilha, validar_estoque
-from services.process import processar_arquivo
+import secrets
 
-def handle_upload(path_arquivo, id_produto, logger):
+from config import PLANO_TTL_SEGUNDOS
+from services.validations import (
+    validar_planilha, validar_estoque, validar_planilha_lote, validar_estoque_lote,
+    conexao_banco, buscar_patrimonios_por
+)
+from services.process import (
+    processar_arquivo, montar_plano, id_patrimonio, _normalizar_patrimonios, _identificar_linha
+)
+from services.metrics import medir, incrementar
+from services.cache import criar_cache
+from services import indice_duplicidade
+
+# Planos gerados no dry-run, aguardando confirmação (token -> plano)
+# (no SQLite compartilhado em modo multiprocesso: o worker que confirma pode não ser o que gerou)
+_planos = criar_cache("planos", PLANO_TTL_SEGUNDOS)
+# Patrimônios atribuídos a planos ainda não confirmados (id -> token), para que
+# outro dry-run ou upload não pegue os mesmos ids. Expiram junto com o plano.
+_reservas = criar_cache("reservas", PLANO_TTL_SEGUNDOS)
+
+
+def _sem_reservados(patrimonios, logger) -> list:
+    """Remove do estoque os patrimônios reservados por outro plano em aberto."""
+    patrimonios = _normalizar_patrimonios(patrimonios, logger)
+    reservados = _reservas.chaves_presentes(id_patrimonio(p) for p in patrimonios)
+    return [p for p in patrimonios if id_patrimonio(p) not in reservados]
+
+
+def _alocar(patrimonios, necessario: int, logger):
+    """
+    Separa `necessario` patrimônios livres (fora de reservas). Devolve (lista, None)
+    ou (None, mensagem) quando, descontadas as reservas, não há o suficiente:
+    o upload é recusado antes de qualquer PUT, em vez de gravar só parte da planilha.
+    """
+    total = len(_normalizar_patrimonios(patrimonios, logger))
+    livres = _sem_reservados(patrimonios, logger)
+    if len(livres) < necessario:
+        reservados = total - len(livres)
+        msg = f"Estoque insuficiente: necessário {necessario}, disponível {len(livres)}"
+        if reservados:
+            msg += f" ({reservados} reservado(s) por simulações em andamento)"
+        logger.warning(msg)
+        return None, msg
+    return livres[:necessario], None
+
+
+def planejar_upload(path_arquivo, id_produto, logger):
+    """Valida planilha e estoque de um produto. Não faz nenhum PUT."""
     # 1️⃣ Valida planilha
-    resultado = validar_planilha(path_arquivo, logger)
+    with medir("upload_validar_planilha"):
+        resultado = validar_planilha(path_arquivo, logger)
     if resultado["status"] != "sucesso":
+        incrementar("patrimonio_uploads_total", status="erro_planilha")
         return resultado
 
     df = resultado["dados"]
 
     # 2️⃣ Valida estoque
-    estoque = validar_estoque(df, id_produto, logger)
+    with medir("upload_validar_estoque"):
+        estoque = validar_estoque(df, id_produto, logger)
     if estoque["status"] != "sucesso":
+        incrementar("patrimonio_uploads_total", status="erro_estoque")
         return estoque
 
-    patrimonios = estoque["patrimonios"]
+    patrimonios, erro = _alocar(estoque["patrimonios"], len(df), logger)
+    if erro:
+        incrementar("patrimonio_uploads_total", status="erro_estoque")
+        return {"status": "erro", "detalhes": [{"linha": None, "mensagem": erro}]}
+
+    return {"status": "sucesso", "dados": df, "patrimonios": patrimonios, "id_produto": id_produto}
+
+
+def planejar_upload_lote(path_arquivo, logger):
+    """
+    Upload com vários produtos no mesmo arquivo (coluna id_produto ou uma aba por produto).
+    Valida tudo uma vez, busca o estoque de cada produto em paralelo e alinha cada
+    linha ao patrimônio do seu produto. Não faz nenhum PUT.
+    """
+    # 1️⃣ Valida planilha (todas as abas)
+    with medir("upload_validar_planilha"):
+        resultado = validar_planilha_lote(path_arquivo, logger)
+    if resultado["status"] != "sucesso":
+        incrementar("patrimonio_uploads_total", status="erro_planilha")
+        return resultado
 
+    df = resultado["dados"]
+    grupos = {str(id_produto): grupo for id_produto, grupo in df.groupby("id_produto", sort=False)}
+
+    # 2️⃣ Valida estoque de cada produto em paralelo
+    with medir("upload_validar_estoque"):
+        estoque = validar_estoque_lote(grupos, logger)
+    if estoque["status"] != "sucesso":
+        incrementar("patrimonio_uploads_total", status="erro_estoque")
+        return estoque
+
+    import pandas as pd
+
+    # Reordena as linhas por produto e alinha cada uma ao patrimônio do seu produto
+    partes = []
+    patrimonios = []
+    detalhes_erros = []
+    for id_produto, grupo in grupos.items():
+        disponiveis, erro = _alocar(estoque["patrimonios"][id_produto], len(grupo), logger)
+        if erro:
+            detalhes_erros.append({"linha": None, "id_produto": id_produto,
+                                   "mensagem": f"Produto {id_produto}: {erro}"})
+            continue
+        partes.append(grupo)
+        patrimonios.extend(disponiveis)
+
+    if detalhes_erros:
+        incrementar("patrimonio_uploads_total", status="erro_estoque")
+        return {"status": "erro", "detalhes": detalhes_erros}
+
+    return {"status": "sucesso", "dados": pd.concat(partes, ignore_index=True), "patrimonios": patrimonios}
+
+
+def executar_plano(plano, logger):
     # 3️⃣ Processa arquivo
-    return processar_arquivo(df, patrimonios, logger)
+    with medir("upload_processar_arquivo"):
+        resultado = processar_arquivo(plano["dados"], plano["patrimonios"], logger)
+    incrementar("patrimonio_uploads_total", status=resultado["status"])
+
+    # Os valores gravados passam a contar como duplicados para os outros workers
+    indice_duplicidade.registrar(
+        (d["mac"], d["serie"], d["id"], d.get("id_produto") or plano.get("id_produto"))
+        for d in resultado["detalhes"] if d["status"] == "sucesso"
+    )
+    return resultado
+
+
+def handle_upload(path_arquivo, id_produto, logger):
+    plano = planejar_upload(path_arquivo, id_produto, logger)
+    if plano["status"] != "sucesso":
+        return plano
+    return executar_plano(plano, logger)
+
+
+def handle_upload_lote(path_arquivo, logger):
+    plano = planejar_upload_lote(path_arquivo, logger)
+    if plano["status"] != "sucesso":
+        return plano
+    return executar_plano(plano, logger)
+
+
+def handle_dry_run(path_arquivo, id_produto, usuario, logger):
+    """
+    Executa validação e consulta de estoque e devolve a atribuição linha -> patrimônio
+    sem fazer PUTs. O plano fica guardado por PLANO_TTL_SEGUNDOS sob um token que
+    pode ser confirmado em confirmar_plano.
+    """
+    if id_produto:
+        plano = planejar_upload(path_arquivo, id_produto, logger)
+    else:
+        plano = planejar_upload_lote(path_arquivo, logger)
+    if plano["status"] != "sucesso":
+        return plano
+
+    atribuicoes = montar_plano(plano["dados"], plano["patrimonios"], logger)
+    token = secrets.token_urlsafe(16)
+
+    ids = [a["patrimonio_id"] for a in atribuicoes if a["patrimonio_id"]]
+    reservados = _reservas.guardar_se_ausente(ids, token)
+    if len(reservados) < len(ids):
+        # Outro dry-run reservou parte dos mesmos ids entre a consulta e a reserva
+        _reservas.descartar(reservados)
+        return {"status": "erro", "detalhes": [{
+            "linha": None,
+            "mensagem": "Patrimônios reservados por outra simulação em andamento. Tente novamente."
+        }]}
+    _planos.guardar(token, {"usuario": usuario, **plano})
+    incrementar("patrimonio_uploads_total", status="dry_run")
+
+    sem_patrimonio = sum(1 for a in atribuicoes if a["patrimonio_id"] is None)
+    logger.info(f"📝 Plano {token[:6]}… gerado para {usuario}: {len(atribuicoes)} linhas, "
+                f"{sem_patrimonio} sem patrimônio")
+
+    return {
+        "status": "sucesso",
+        "dry_run": True,
+        "token": token,
+        "expira_em_segundos": PLANO_TTL_SEGUNDOS,
+        "total_linhas": len(atribuicoes),
+        "sem_patrimonio": sem_patrimonio,
+        "plano": atribuicoes,
+    }
+
+
+def _revalidar_plano(plano, logger) -> list:
+    """
+    Confere no banco, em três consultas em lote, se o plano ainda vale: cada
+    patrimônio atribuído continua vazio e nenhum MAC/série foi cadastrado desde o
+    dry-run. Devolve os erros por linha (lista vazia = pode executar).
+    """
+    patrimonios = _normalizar_patrimonios(plano["patrimonios"], logger)
+    linhas = []
+    for i, row in plano["dados"].iterrows():
+        patrimonio_id = id_patrimonio(patrimonios[i]) if i < len(patrimonios) else None
+        linhas.append((i, row, patrimonio_id,
+                       str(row.get("mac") or "").strip(), str(row.get("serie") or "").strip()))
+
+    with medir("revalidar_plano"), conexao_banco() as conn:
+        por_id = {str(r["id"]): r for r in buscar_patrimonios_por(conn, "id", (l[2] for l in linhas))}
+        macs = {str(r["id_mac"]).lower(): r["id"]
+                for r in buscar_patrimonios_por(conn, "id_mac", (l[3] for l in linhas))}
+        series = {str(r["serial_fornecedor"]).lower(): r["id"]
+                  for r in buscar_patrimonios_por(conn, "serial_fornecedor", (l[4] for l in linhas))}
+
+    erros = []
+    for i, row, patrimonio_id, mac, serie in linhas:
+        if patrimonio_id is None:
+            continue  # processar_arquivo já reporta "Sem patrimônio disponível"
+        atual = por_id.get(patrimonio_id)
+        if atual is None:
+            mensagem = f"Patrimônio {patrimonio_id} não existe mais"
+        elif atual["id_mac"] or atual["serial_fornecedor"]:
+            mensagem = f"Patrimônio {patrimonio_id} foi preenchido depois da simulação"
+        elif mac and mac.lower() in macs:
+            mensagem = f"MAC {mac} cadastrado depois da simulação (patrimônio {macs[mac.lower()]})"
+        elif serie and serie.lower() in series:
+            mensagem = f"Série {serie} cadastrada depois da simulação (patrimônio {series[serie.lower()]})"
+        else:
+            continue
+        erros.append({**_identificar_linha(i, row), "id": patrimonio_id, "status": "erro", "mensagem": mensagem})
+    return erros
+
+
+def _liberar_reservas(plano, logger):
+    """Devolve ao estoque os patrimônios reservados pelo plano (confirmado ou descartado)."""
+    _reservas.descartar(id_patrimonio(p) for p in _normalizar_patrimonios(plano["patrimonios"], logger))
+
+
+def _plano_indisponivel():
+    return {"status": "erro", "detalhes": [{
+        "linha": None,
+        "mensagem": "Plano expirado, já confirmado ou inexistente. Envie a planilha novamente."
+    }]}
+
+
+def confirmar_plano(token, usuario, logger):
+    """
+    Executa apenas os PUTs de um plano gerado no dry-run (uso único). Antes, confere
+    em lote se os patrimônios e MAC/séries do plano não mudaram desde a simulação;
+    se algo mudou, nenhum PUT é feito.
+    """
+    plano = _planos.obter(token)
+    if plano is not None and plano["usuario"] != usuario:
+        logger.warning(f"⚠ {usuario} tentou confirmar plano de {plano['usuario']}")
+        plano = None
+    if plano is None:
+        return _plano_indisponivel()
+
+    try:
+        conflitos = _revalidar_plano(plano, logger)
+    except Exception as e:
+        # Banco indisponível: o plano continua no cache e pode ser confirmado de novo
+        logger.exception(f"Falha ao revalidar plano {token[:6]}…")
+        return {"status": "erro", "detalhes": [{
+            "linha": None, "mensagem": f"Não foi possível revalidar o plano no banco: {e}"
+        }]}
+
+    # Retira do cache antes de processar: duas confirmações simultâneas não repetem os PUTs
+    plano = _planos.retirar(token)
+    if plano is None:
+        return _plano_indisponivel()
+
+    if conflitos:
+        _liberar_reservas(plano, logger)
+        incrementar("patrimonio_uploads_total", status="erro_plano_desatualizado")
+        logger.warning(f"⚠ Plano {token[:6]}… de {usuario} desatualizado: {len(conflitos)} linha(s)")
+        return {"status": "erro", "detalhes": [{
+            "linha": None,
+            "mensagem": f"{len(conflitos)} linha(s) mudaram desde a simulação e nada foi enviado. "
+                        "Simule novamente."
+        }, *conflitos]}
+
+    logger.info(f"🚀 Confirmando plano {token[:6]}… de {usuario}: {len(plano['dados'])} linhas")
+    try:
+        return executar_plano(plano, logger)
+    finally:
+        # Os preenchidos já saem do estoque; os que falharam voltam a ficar disponíveis
+        _liberar_reservas(plano, logger)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-import mysql.connector
-from config import DB_CONFIG
+from config import DB_CONFIG, PRODUTOS_CACHE_TTL
+from services.metrics import medir
+from services.cache import criar_cache
 import logging
 
 router = APIRouter()
@@ -8,6 +9,9 @@ router = APIRouter()
 # Pega o logger já existente (sem criar handlers)
 logger = logging.getLogger("produto_controller")
 
+# Lista de produtos muda pouco e é pedida a cada carregamento da tela
+_cache_produtos = criar_cache("produtos", PRODUTOS_CACHE_TTL)
+
 query = """
     SELECT 
         p.id,
@@ -21,17 +25,26 @@ query = """
 
 @router.get("/produtos")
 def listar_produtos():
+    import mysql.connector
+
+    produtos = _cache_produtos.obter("lista")
+    if produtos is not None:
+        return produtos
+
     try:
         logger.info("Iniciando consulta de produtos no banco")
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(query)
-        resultados = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with medir("db_produtos"):
+            conn = mysql.connector.connect(**DB_CONFIG)
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(query)
+            resultados = cursor.fetchall()
+            cursor.close()
+            conn.close()
         logger.info(f"{len(resultados)} produtos encontrados")
 
-        return [{"id": r["id"], "text": f'{r["id"]} - {r["descricao"]}'} for r in resultados]
+        produtos = [{"id": r["id"], "text": f'{r["id"]} - {r["descricao"]}'} for r in resultados]
+        _cache_produtos.guardar("lista", produtos)
+        return produtos
 
     except mysql.connector.Error as err:
         logger.error(f"Erro ao consultar o banco: {err}")
@@ -0,0 +1,47 @@
+"""
+Configuração do gunicorn para rodar a API com vários workers uvicorn:
+
+    gunicorn main:app -c gunicorn.conf.py
+
+Variáveis: BIND (padrão 0.0.0.0:8000), WEB_CONCURRENCY (padrão: nº de CPUs),
+WORKER_TIMEOUT (padrão 600s, uploads grandes fazem milhares de PUTs).
+
+Neste modo (MULTIPROCESSO=1):
+- os logs de todos os workers passam por uma fila e são gravados por um único
+  listener no master;
+- planos de dry-run, lista de produtos, índice de duplicidade e métricas ficam
+  no SQLite local compartilhado (CACHE_DB_PATH).
+"""
+import multiprocessing
+import os
+
+# Precisa estar definido antes de qualquer import de config (master e workers)
+os.environ.setdefault("MULTIPROCESSO", "1")
+
+from logger_config import iniciar_listener_logs
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("WORKER_TIMEOUT", 600))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers periodicamente; o estado compartilhado fica no SQLite
+max_requests = 1000
+max_requests_jitter = 100
+
+_listener_logs = None
+
+
+def on_starting(server):
+    global _listener_logs
+    from services import metrics
+
+    metrics.limpar_compartilhadas()
+    _listener_logs = iniciar_listener_logs()
+
+
+def on_exit(server):
+    if _listener_logs is not None:
+        _listener_logs.stop()
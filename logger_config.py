@@ -0,0 +1,98 @@
+import logging
+import os
+from datetime import datetime
+from logging.handlers import QueueHandler
+
+SISTEMA_LOG_DIR = "logs/sistema"
+LOGIN_LOG_DIR = "logs/login"
+
+FORMATO_SISTEMA = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+FORMATO_LOGIN = "%(asctime)s | %(levelname)s | %(message)s"
+FORMATO_DATA = "%d/%m/%Y %H:%M:%S"
+
+LOGGERS_APP = ("sistema", "login")
+
+_configurado = False
+# Fila criada pelo master do gunicorn antes do fork (ver gunicorn.conf.py)
+_fila_logs = None
+
+
+class ArquivoDiarioHandler(logging.FileHandler):
+    """
+    FileHandler que grava em <diretorio>/<prefixo>_AAAAMMDD.log e troca de
+    arquivo quando o dia vira, mesmo com o processo rodando há dias.
+    """
+
+    def __init__(self, diretorio: str, prefixo: str):
+        self.diretorio = diretorio
+        self.prefixo = prefixo
+        self._dia = datetime.now().strftime("%Y%m%d")
+        os.makedirs(diretorio, exist_ok=True)
+        super().__init__(self._caminho(self._dia), encoding="utf-8")
+
+    def _caminho(self, dia: str) -> str:
+        return os.path.join(self.diretorio, f"{self.prefixo}_{dia}.log")
+
+    def emit(self, record):
+        dia = datetime.now().strftime("%Y%m%d")
+        if dia != self._dia:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(self._caminho(dia))
+            self._dia = dia
+        super().emit(record)
+
+
+def _criar_handlers() -> list:
+    """Handlers de arquivo (um por logger, via filtro) e de console."""
+    sistema_handler = ArquivoDiarioHandler(SISTEMA_LOG_DIR, "sistema")
+    sistema_handler.setFormatter(logging.Formatter(FORMATO_SISTEMA, datefmt=FORMATO_DATA))
+    sistema_handler.addFilter(logging.Filter("sistema"))
+
+    login_handler = ArquivoDiarioHandler(LOGIN_LOG_DIR, "login")
+    login_handler.setFormatter(logging.Formatter(FORMATO_LOGIN, datefmt=FORMATO_DATA))
+    login_handler.addFilter(logging.Filter("login"))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(FORMATO_SISTEMA, datefmt=FORMATO_DATA))
+
+    return [sistema_handler, login_handler, console_handler]
+
+
+def configurar_logs():
+    """
+    Registra os handlers dos loggers "sistema" e "login". Chamado no startup da
+    aplicação (lifespan), não no import, para que importar os módulos não tenha
+    efeitos colaterais. Chamadas repetidas não duplicam handlers.
+
+    Em modo multiprocesso (fila criada por iniciar_listener_logs no master), os
+    workers só enfileiram os registros e um único listener escreve nos arquivos.
+    """
+    global _configurado
+    if _configurado:
+        return
+    _configurado = True
+
+    handlers = [QueueHandler(_fila_logs)] if _fila_logs is not None else _criar_handlers()
+    for nome in LOGGERS_APP:
+        app_logger = logging.getLogger(nome)
+        app_logger.setLevel(logging.INFO)
+        for handler in handlers:
+            app_logger.addHandler(handler)
+
+
+def iniciar_listener_logs():
+    """
+    Cria a fila de logs compartilhada e o listener que grava os arquivos. Deve ser
+    chamado no processo master antes do fork dos workers, que herdam a fila.
+    Assim só um processo escreve em cada arquivo e a troca diária não conflita.
+    """
+    global _fila_logs
+    import multiprocessing
+    from logging.handlers import QueueListener
+
+    _fila_logs = multiprocessing.Queue(-1)
+    listener = QueueListener(_fila_logs, *_criar_handlers(), respect_handler_level=True)
+    listener.start()
+    return listener
@@ -2,16 +2,27 @@ import os
 import shutil
 import logging
 import tempfile
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import (
+    HTMLResponse, JSONResponse, RedirectResponse, PlainTextResponse, StreamingResponse, FileResponse
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from config import ACCESS_TOKEN_EXPIRE_HOURS
-from controllers.patrimonio_controller import handle_upload
+from config import ACCESS_TOKEN_EXPIRE_HOURS, METRICS_TIMING_HEADER
+from logger_config import configurar_logs
+from controllers.patrimonio_controller import (
+    handle_upload, handle_upload_lote, handle_dry_run, confirmar_plano
+)
 from controllers.produto_controller import router as produto_router
-from services.validations import validar_planilha
+from services import metrics
+from services.exportacao import gerar_csv, gerar_xlsx
+from services.jobs import registrar_job, obter_job
 
 from auth.ldap_utils import autenticar_ldap, usuario_tem_acesso
 from auth.token_utils import criar_token
@@ -19,35 +30,21 @@ from auth.deps import get_usuario_logado_cookie
 
 # ----------------- CONFIG -----------------
 UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-SISTEMA_LOG_DIR = "logs/sistema"
-os.makedirs(SISTEMA_LOG_DIR, exist_ok=True)
 
 # ----------------- LOGGER DO SISTEMA -----------------
-hoje = datetime.now().strftime("%Y%m%d")
+# Os handlers são registrados no startup (lifespan), não no import
 sistema_logger = logging.getLogger("sistema")
-sistema_logger.setLevel(logging.INFO)
-
-file_handler = logging.FileHandler(
-    filename=os.path.join(SISTEMA_LOG_DIR, f"sistema_{hoje}.log"),
-    encoding="utf-8"
-)
-file_handler.setFormatter(logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    datefmt="%d/%m/%Y %H:%M:%S"
-))
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter(
-    "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-    datefmt="%d/%m/%Y %H:%M:%S"
-))
-
-sistema_logger.addHandler(file_handler)
-sistema_logger.addHandler(console_handler)
 
 # ----------------- APP -----------------
-app = FastAPI(title="Patrimônio API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configurar_logs()
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    metrics.iniciar_publicacao()
+    yield
+    await run_in_threadpool(metrics.parar_publicacao)
+
+app = FastAPI(title="Patrimônio API", lifespan=lifespan)
 
 # ----------------- MIDDLEWARE PARA TRATAR TOKEN EXPIRADO -----------------
 @app.middleware("http")
@@ -62,6 +59,33 @@ async def redirect_on_auth_error(request: Request, call_next):
 
     return response
 
+# ----------------- MIDDLEWARE DE MÉTRICAS -----------------
+@app.middleware("http")
+async def medir_requisicao(request: Request, call_next):
+    token = metrics.iniciar_spans()
+    inicio = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        duracao = time.perf_counter() - inicio
+        spans = metrics.encerrar_spans(token)
+
+    # Usa o template da rota ("/patrimonio/upload") para não explodir a cardinalidade
+    rota = getattr(request.scope.get("route"), "path", "outros")
+    metrics.observar("http_requisicao_duracao_segundos", duracao, rota=rota)
+    metrics.incrementar("http_requisicoes_total", rota=rota, metodo=request.method,
+                        status=response.status_code)
+
+    if METRICS_TIMING_HEADER:
+        spans.append(("total", duracao))
+        response.headers["Server-Timing"] = metrics.header_server_timing(spans)
+
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def exportar_metricas():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # ----------------- AUTENTICAÇÃO -----------------
 @app.get("/", response_class=HTMLResponse)
 async def login_page():
@@ -119,15 +143,28 @@ async def home_page(usuario_logado: dict = Depends(get_usuario_logado_cookie)):
     with open("templates/index.html", "r", encoding="utf-8") as f:
         return HTMLResponse(content=f.read())
 
+def _registrar_resultado(usuario: str, arquivo, resultado: dict):
+    """Guarda o resultado linha a linha para exportação e acrescenta o job_id à resposta."""
+    try:
+        resultado["job_id"] = registrar_job(usuario, arquivo, resultado)
+    except Exception:
+        # Os PUTs já foram feitos: a falha ao guardar o job não invalida o upload
+        sistema_logger.exception("⚠ Não foi possível registrar o job do upload")
+
 @app.post('/patrimonio/upload')
 async def upload_saldo(
-    id_produto: str = Form(...),
+    id_produto: str = Form(""),
     file: UploadFile = File(...),
+    dry_run: bool = Form(False),
     usuario_logado: dict = Depends(get_usuario_logado_cookie)
 ):
-    if not id_produto:
-        raise HTTPException(status_code=400, detail="id_produto é obrigatório")
-
+    """
+    Com id_produto, todas as linhas vão para esse produto.
+    Sem id_produto, o upload é em lote: o produto vem da coluna id_produto
+    ou do nome de cada aba da planilha.
+    Com dry_run, nada é gravado no IXC: devolve o plano linha -> patrimônio e
+    um token para /patrimonio/upload/confirmar.
+    """
     if not file.filename.lower().endswith(('.xls', '.xlsx')):
         raise HTTPException(status_code=400, detail="Arquivo deve ser .xls ou .xlsx")
 
@@ -149,13 +186,19 @@ async def upload_saldo(
         with open(tmp_path, 'wb') as f:
             f.write(file_bytes)
 
-        # ------------------- VALIDAÇÃO -------------------
-        validacao = validar_planilha(tmp_path, sistema_logger)
-        if validacao["status"] != "sucesso":
-            resultado = validacao
+        # ------------------- VALIDAÇÃO E PROCESSAMENTO -------------------
+        # Roda em thread: o processamento é bloqueante e travaria o event loop do worker
+        if dry_run:
+            resultado = await run_in_threadpool(
+                handle_dry_run, tmp_path, id_produto, usuario_logado['usuario'], sistema_logger)
+        elif id_produto:
+            resultado = await run_in_threadpool(handle_upload, tmp_path, id_produto, sistema_logger)
         else:
-            df_valido = validacao["dados"]
-            resultado = handle_upload(tmp_path, id_produto, sistema_logger)
+            sistema_logger.info(f"📦 Upload em lote: {nome_novo}")
+            resultado = await run_in_threadpool(handle_upload_lote, tmp_path, sistema_logger)
+
+        if not dry_run or resultado.get("status") != "sucesso":
+            await run_in_threadpool(_registrar_resultado, usuario_logado['usuario'], file.filename, resultado)
 
     except Exception as e:
         sistema_logger.exception("❌ Falha ao salvar/processar arquivo")
@@ -170,6 +213,64 @@ async def upload_saldo(
     status_code = 200 if resultado.get("status") == "sucesso" else 400
     return JSONResponse(status_code=status_code, content=resultado)
 
+@app.post('/patrimonio/upload/confirmar')
+async def confirmar_upload(
+    token: str = Form(...),
+    usuario_logado: dict = Depends(get_usuario_logado_cookie)
+):
+    """Executa os PUTs de um plano gerado com dry_run, sem reler nem revalidar a planilha."""
+    try:
+        resultado = await run_in_threadpool(confirmar_plano, token, usuario_logado['usuario'], sistema_logger)
+        await run_in_threadpool(_registrar_resultado, usuario_logado['usuario'], None, resultado)
+    except Exception as e:
+        sistema_logger.exception("❌ Falha ao confirmar plano de upload")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    status_code = 200 if resultado.get("status") == "sucesso" else 400
+    return JSONResponse(status_code=status_code, content=resultado)
+
+@app.get('/patrimonio/jobs/{job_id}/export')
+async def exportar_job(
+    job_id: str,
+    formato: str = "xlsx",
+    usuario_logado: dict = Depends(get_usuario_logado_cookie)
+):
+    """
+    Resultado completo de um upload (linha, MAC, série, patrimônio atribuído, status
+    e mensagem) em XLSX ou CSV, gerado sem carregar todas as linhas em memória.
+    """
+    if formato not in ("xlsx", "csv"):
+        raise HTTPException(status_code=400, detail="Formato deve ser xlsx ou csv")
+
+    job = await run_in_threadpool(obter_job, job_id)
+    if job is None or job["usuario"] != usuario_logado['usuario']:
+        # 404 também para jobs de outro usuário, sem revelar que existem
+        raise HTTPException(status_code=404, detail="Resultado não encontrado ou expirado")
+
+    nome = f"resultado_{job_id}.{formato}"
+    if formato == "csv":
+        return StreamingResponse(
+            gerar_csv(job_id),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{nome}"'}
+        )
+
+    fd, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await run_in_threadpool(gerar_xlsx, job_id, caminho)
+    except Exception as e:
+        os.remove(caminho)
+        sistema_logger.exception(f"❌ Falha ao exportar job {job_id}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return FileResponse(
+        caminho,
+        filename=nome,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        background=BackgroundTask(os.remove, caminho)
+    )
+
 # ----------------- STATIC FILES -----------------
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -0,0 +1,258 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from config import CACHE_BACKEND, CACHE_DB_PATH
+
+
+class CacheTTL:
+    """
+    Cache em memória com expiração por item. Usado para guardar dados caros de
+    recalcular por pouco tempo (ex.: planos de upload gerados no dry-run).
+    """
+
+    def __init__(self, ttl_padrao: float):
+        self.ttl_padrao = ttl_padrao
+        self._itens = {}
+        self._trava = threading.Lock()
+
+    def _limpar_expirados(self, agora: float):
+        expirados = [chave for chave, (expira, _) in self._itens.items() if expira <= agora]
+        for chave in expirados:
+            del self._itens[chave]
+
+    def guardar(self, chave: str, valor, ttl: float = None):
+        agora = time.monotonic()
+        with self._trava:
+            self._limpar_expirados(agora)
+            self._itens[chave] = (agora + (ttl or self.ttl_padrao), valor)
+
+    def obter(self, chave: str, padrao=None):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is None or item[0] <= time.monotonic():
+                return padrao
+            return item[1]
+
+    def retirar(self, chave: str, padrao=None):
+        """Remove e devolve o item; só uma chamada concorrente recebe o valor."""
+        with self._trava:
+            item = self._itens.pop(chave, None)
+            if item is None or item[0] <= time.monotonic():
+                return padrao
+            return item[1]
+
+    def descartar(self, chaves):
+        """Remove as `chaves` de uma vez (as que não existem são ignoradas)."""
+        with self._trava:
+            for chave in chaves:
+                self._itens.pop(chave, None)
+
+    def chaves_presentes(self, chaves) -> set:
+        """Quais das `chaves` têm item válido, em uma só passada."""
+        agora = time.monotonic()
+        with self._trava:
+            return {chave for chave in chaves
+                    if chave in self._itens and self._itens[chave][0] > agora}
+
+    def guardar_se_ausente(self, chaves, valor, ttl: float = None) -> set:
+        """Guarda `valor` nas chaves ainda livres (ou expiradas) e devolve as que conseguiu."""
+        agora = time.monotonic()
+        guardadas = set()
+        with self._trava:
+            self._limpar_expirados(agora)
+            for chave in chaves:
+                if chave not in self._itens:
+                    self._itens[chave] = (agora + (ttl or self.ttl_padrao), valor)
+                    guardadas.add(chave)
+        return guardadas
+
+
+# ----------------- SQLITE COMPARTILHADO ENTRE WORKERS -----------------
+# Também guarda os resultados de upload (jobs), usados na exportação
+_ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        namespace TEXT NOT NULL,
+        chave TEXT NOT NULL,
+        expira REAL NOT NULL,
+        valor BLOB NOT NULL,
+        PRIMARY KEY (namespace, chave)
+    );
+    CREATE TABLE IF NOT EXISTS metricas_processos (
+        processo TEXT PRIMARY KEY,
+        atualizado_em REAL NOT NULL,
+        dados TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS indice_duplicidade (
+        tipo TEXT NOT NULL,
+        valor TEXT NOT NULL,
+        patrimonio_id TEXT,
+        id_produto TEXT,
+        PRIMARY KEY (tipo, valor)
+    );
+    CREATE TABLE IF NOT EXISTS indice_duplicidade_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        carregado_em REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        usuario TEXT NOT NULL,
+        arquivo TEXT,
+        criado_em REAL NOT NULL,
+        status TEXT NOT NULL,
+        total_linhas INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_criado_em ON jobs (criado_em);
+    CREATE TABLE IF NOT EXISTS job_linhas (
+        job_id TEXT NOT NULL,
+        ordem INTEGER NOT NULL,
+        linha INTEGER,
+        aba TEXT,
+        id_produto TEXT,
+        mac TEXT,
+        serie TEXT,
+        patrimonio_id TEXT,
+        status TEXT,
+        mensagem TEXT,
+        PRIMARY KEY (job_id, ordem)
+    );
+"""
+
+_local = threading.local()
+
+# Quantidade de chaves por consulta "IN (...)" (limite de parâmetros do SQLite)
+TAMANHO_BLOCO = 500
+
+
+def abrir_sqlite(caminho: str = None) -> sqlite3.Connection:
+    """Abre uma conexão nova com o SQLite compartilhado, criando as tabelas se preciso."""
+    caminho = caminho or CACHE_DB_PATH
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+
+    # isolation_level=None: autocommit; transações são abertas explicitamente
+    conn = sqlite3.connect(caminho, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_ESQUEMA)
+    return conn
+
+
+def conexao_sqlite() -> sqlite3.Connection:
+    """
+    Conexão da thread atual com o SQLite compartilhado. Conexões herdadas de outro
+    processo (fork do gunicorn) são descartadas e reabertas.
+    """
+    atual = getattr(_local, "conexao", None)
+    if atual is None or atual[0] != os.getpid():
+        _local.conexao = (os.getpid(), abrir_sqlite())
+    return _local.conexao[1]
+
+
+class CacheSQLite:
+    """
+    Mesma interface de CacheTTL, mas guardada no SQLite local compartilhado,
+    para que todos os workers enxerguem os mesmos itens (ex.: um plano criado
+    no worker A pode ser confirmado no worker B).
+    """
+
+    def __init__(self, namespace: str, ttl_padrao: float):
+        self.namespace = namespace
+        self.ttl_padrao = ttl_padrao
+
+    def guardar(self, chave: str, valor, ttl: float = None):
+        agora = time.time()
+        conn = conexao_sqlite()
+        conn.execute("DELETE FROM cache WHERE namespace = ? AND expira <= ?", (self.namespace, agora))
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (namespace, chave, expira, valor) VALUES (?, ?, ?, ?)",
+            (self.namespace, chave, agora + (ttl or self.ttl_padrao),
+             pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+        )
+
+    def obter(self, chave: str, padrao=None):
+        linha = conexao_sqlite().execute(
+            "SELECT valor FROM cache WHERE namespace = ? AND chave = ? AND expira > ?",
+            (self.namespace, chave, time.time())
+        ).fetchone()
+        return pickle.loads(linha[0]) if linha else padrao
+
+    def retirar(self, chave: str, padrao=None):
+        """Remove e devolve o item; só um worker/thread concorrente recebe o valor."""
+        conn = conexao_sqlite()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            linha = conn.execute(
+                "SELECT valor, expira FROM cache WHERE namespace = ? AND chave = ?",
+                (self.namespace, chave)
+            ).fetchone()
+            if linha:
+                conn.execute("DELETE FROM cache WHERE namespace = ? AND chave = ?", (self.namespace, chave))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        if not linha or linha[1] <= time.time():
+            return padrao
+        return pickle.loads(linha[0])
+
+    def descartar(self, chaves):
+        """Remove as `chaves` de uma vez, com um "DELETE ... IN (...)" por bloco."""
+        chaves = [c for c in set(chaves) if c is not None]
+        conn = conexao_sqlite()
+        for inicio in range(0, len(chaves), TAMANHO_BLOCO):
+            bloco = chaves[inicio:inicio + TAMANHO_BLOCO]
+            marcadores = ",".join("?" * len(bloco))
+            conn.execute(f"DELETE FROM cache WHERE namespace = ? AND chave IN ({marcadores})",
+                         [self.namespace, *bloco])
+
+    def chaves_presentes(self, chaves) -> set:
+        """Quais das `chaves` têm item válido, com uma consulta "IN (...)" por bloco."""
+        chaves = [c for c in set(chaves) if c is not None]
+        agora = time.time()
+        conn = conexao_sqlite()
+        presentes = set()
+        for inicio in range(0, len(chaves), TAMANHO_BLOCO):
+            bloco = chaves[inicio:inicio + TAMANHO_BLOCO]
+            marcadores = ",".join("?" * len(bloco))
+            presentes.update(chave for (chave,) in conn.execute(
+                f"SELECT chave FROM cache WHERE namespace = ? AND expira > ? AND chave IN ({marcadores})",
+                [self.namespace, agora, *bloco]
+            ))
+        return presentes
+
+    def guardar_se_ausente(self, chaves, valor, ttl: float = None) -> set:
+        """
+        Guarda `valor` nas chaves ainda livres (ou expiradas) e devolve as que conseguiu.
+        Tudo em uma transação: entre workers concorrentes, cada chave fica com um só.
+        """
+        agora = time.time()
+        dados = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        guardadas = set()
+        conn = conexao_sqlite()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE namespace = ? AND expira <= ?", (self.namespace, agora))
+            for chave in chaves:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO cache (namespace, chave, expira, valor) VALUES (?, ?, ?, ?)",
+                    (self.namespace, chave, agora + (ttl or self.ttl_padrao), dados)
+                )
+                if cursor.rowcount:
+                    guardadas.add(chave)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return guardadas
+
+
+def criar_cache(namespace: str, ttl_padrao: float):
+    """Cache do backend configurado em CACHE_BACKEND ("memoria" ou "sqlite")."""
+    if CACHE_BACKEND == "sqlite":
+        return CacheSQLite(namespace, ttl_padrao)
+    return CacheTTL(ttl_padrao)
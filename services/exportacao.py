@@ -0,0 +1,46 @@
+import csv
+import io
+from typing import Iterator
+
+from services.jobs import iterar_linhas
+from services.metrics import medir
+
+CABECALHO = ["Linha", "Aba", "Produto", "MAC", "Série", "Patrimônio", "Status", "Mensagem"]
+
+# Linhas acumuladas antes de enviar um pedaço do CSV
+LINHAS_POR_PEDACO = 1000
+
+
+def gerar_csv(job_id: str) -> Iterator[bytes]:
+    """
+    Gera o CSV do job em pedaços, para ser enviado via StreamingResponse sem montar
+    o arquivo inteiro em memória. Separador ";" e BOM para abrir direto no Excel.
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=";")
+
+    buffer.write("\ufeff")
+    escritor.writerow(CABECALHO)
+    for i, linha in enumerate(iterar_linhas(job_id), start=1):
+        escritor.writerow(["" if v is None else v for v in linha])
+        if i % LINHAS_POR_PEDACO == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def gerar_xlsx(job_id: str, destino: str):
+    """
+    Grava o XLSX do job em `destino` usando o modo write-only do openpyxl, que
+    escreve as linhas direto no arquivo em vez de manter a planilha em memória.
+    """
+    from openpyxl import Workbook
+
+    with medir("exportacao_xlsx"):
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Resultado")
+        ws.append(CABECALHO)
+        for linha in iterar_linhas(job_id):
+            ws.append(list(linha))
+        wb.save(destino)
@@ -0,0 +1,124 @@
+import logging
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Tuple
+
+from config import CACHE_BACKEND, DUPLICIDADE_CACHE_TTL
+from services.cache import conexao_sqlite
+
+logger = logging.getLogger("validations")
+
+# Quantidade de valores por consulta "IN (...)" (limite de parâmetros do SQLite)
+TAMANHO_BLOCO = 500
+
+
+def ativo() -> bool:
+    """O índice compartilhado só existe no backend sqlite e com TTL > 0."""
+    return CACHE_BACKEND == "sqlite" and DUPLICIDADE_CACHE_TTL > 0
+
+
+def _expirado(conn: sqlite3.Connection) -> bool:
+    linha = conn.execute("SELECT carregado_em FROM indice_duplicidade_meta WHERE id = 1").fetchone()
+    return linha is None or time.time() - linha[0] > DUPLICIDADE_CACHE_TTL
+
+
+def _linhas_indice(registros: Iterable[dict]):
+    for r in registros:
+        if r["id_mac"]:
+            yield ("mac", r["id_mac"], str(r["id"]), str(r["id_produto"]))
+        if r["serial_fornecedor"]:
+            yield ("serie", r["serial_fornecedor"], str(r["id"]), str(r["id_produto"]))
+
+
+def _recarregar(conn: sqlite3.Connection, carregar: Callable[[], list]):
+    """
+    Recarrega o índice a partir do banco. A leitura do MySQL acontece fora da
+    transação, para não segurar o lock de escrita do SQLite durante a consulta;
+    dentro do BEGIN IMMEDIATE só a troca das linhas. Se outro worker recarregou
+    nesse meio-tempo, a leitura é descartada.
+    """
+    registros = carregar()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if _expirado(conn):
+            conn.execute("DELETE FROM indice_duplicidade")
+            conn.executemany(
+                "INSERT OR REPLACE INTO indice_duplicidade (tipo, valor, patrimonio_id, id_produto) "
+                "VALUES (?, ?, ?, ?)",
+                _linhas_indice(registros)
+            )
+            conn.execute("INSERT OR REPLACE INTO indice_duplicidade_meta (id, carregado_em) VALUES (1, ?)",
+                         (time.time(),))
+            logger.info(f"Índice de duplicidade recarregado com {len(registros)} patrimônios")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _buscar(conn: sqlite3.Connection, tipo: str, valores: list) -> Dict[str, Tuple[str, str]]:
+    encontrados = {}
+    for inicio in range(0, len(valores), TAMANHO_BLOCO):
+        bloco = valores[inicio:inicio + TAMANHO_BLOCO]
+        marcadores = ",".join("?" * len(bloco))
+        for valor, patrimonio_id, id_produto in conn.execute(
+            f"SELECT valor, patrimonio_id, id_produto FROM indice_duplicidade "
+            f"WHERE tipo = ? AND valor IN ({marcadores})",
+            [tipo, *bloco]
+        ):
+            encontrados[valor] = (patrimonio_id, id_produto)
+    return encontrados
+
+
+def consultar(macs: Iterable[str], series: Iterable[str],
+              carregar: Callable[[], list]) -> Tuple[Dict[str, tuple], Dict[str, tuple]]:
+    """
+    Devolve {mac: (id, id_produto)} e {serie: (id, id_produto)} apenas para os valores
+    informados que já estão cadastrados. `carregar` busca todos os patrimônios no
+    banco e só é chamado quando o índice passou de DUPLICIDADE_CACHE_TTL.
+    """
+    macs = [m for m in set(macs) if m]
+    series = [s for s in set(series) if s]
+    conn = conexao_sqlite()
+
+    try:
+        if _expirado(conn):
+            _recarregar(conn, carregar)
+        return _buscar(conn, "mac", macs), _buscar(conn, "serie", series)
+    except sqlite3.OperationalError as e:
+        # SQLite travado/indisponível: segue sem cache, direto no banco
+        logger.warning(f"Índice de duplicidade indisponível ({e}); consultando o banco diretamente")
+        registros = carregar()
+        macs_existentes = {r["id_mac"]: (r["id"], r["id_produto"]) for r in registros if r["id_mac"]}
+        series_existentes = {r["serial_fornecedor"]: (r["id"], r["id_produto"])
+                             for r in registros if r["serial_fornecedor"]}
+        return macs_existentes, series_existentes
+
+
+def registrar(atualizados: Iterable[Tuple[str, str, str, str]]):
+    """
+    Acrescenta ao índice os (mac, serie, patrimonio_id, id_produto) gravados com sucesso,
+    para que um reenvio da mesma planilha dentro do TTL continue sendo barrado.
+    """
+    if not ativo():
+        return
+
+    linhas = []
+    for mac, serie, patrimonio_id, id_produto in atualizados:
+        if mac:
+            linhas.append(("mac", mac, str(patrimonio_id), str(id_produto or "")))
+        if serie:
+            linhas.append(("serie", serie, str(patrimonio_id), str(id_produto or "")))
+    if not linhas:
+        return
+
+    try:
+        conexao_sqlite().executemany(
+            "INSERT OR REPLACE INTO indice_duplicidade (tipo, valor, patrimonio_id, id_produto) "
+            "VALUES (?, ?, ?, ?)",
+            linhas
+        )
+    except sqlite3.OperationalError as e:
+        # Sem o registro, o próximo recarregamento do banco traz esses valores
+        logger.warning(f"Não foi possível atualizar o índice de duplicidade: {e}")
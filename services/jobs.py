@@ -0,0 +1,119 @@
+import secrets
+import time
+from typing import Dict, Iterator, Optional
+
+from config import JOBS_RETENCAO_DIAS
+from services.cache import conexao_sqlite
+
+COLUNAS_LINHA = ("linha", "aba", "id_produto", "mac", "serie", "patrimonio_id", "status", "mensagem")
+
+# Linhas lidas por consulta ao percorrer um job (paginação por "ordem")
+TAMANHO_PAGINA = 1000
+# Linhas gravadas por transação, para não segurar o lock de escrita do SQLite
+TAMANHO_LOTE_GRAVACAO = 2000
+
+
+def _texto(valor) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+
+def _transacao(conn, *comandos):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql, parametros, varios in comandos:
+            (conn.executemany if varios else conn.execute)(sql, parametros)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def registrar_job(usuario: str, arquivo: str, resultado: Dict) -> str:
+    """
+    Grava o resultado linha a linha de um upload e devolve o job_id.
+    Aceita tanto o retorno de processar_arquivo quanto os erros de validação.
+
+    As linhas vão em transações de TAMANHO_LOTE_GRAVACAO, para que outros workers
+    (métricas, cache) não esperem um job de 100 mil linhas; o registro em "jobs"
+    é gravado por último, então o job só aparece depois de completo.
+    """
+    job_id = secrets.token_hex(8)
+    detalhes = resultado.get("detalhes") or []
+    agora = time.time()
+    conn = conexao_sqlite()
+
+    # Expira jobs antigos junto com a gravação, sem precisar de rotina à parte
+    limite = agora - JOBS_RETENCAO_DIAS * 86400
+    _transacao(
+        conn,
+        ("DELETE FROM job_linhas WHERE job_id IN (SELECT job_id FROM jobs WHERE criado_em < ?)", (limite,), False),
+        ("DELETE FROM jobs WHERE criado_em < ?", (limite,), False),
+    )
+
+    try:
+        for inicio in range(0, len(detalhes), TAMANHO_LOTE_GRAVACAO):
+            linhas = [
+                (job_id, ordem, d.get("linha"), _texto(d.get("aba")), _texto(d.get("id_produto")),
+                 d.get("mac"), d.get("serie"), _texto(d.get("id")), d.get("status", "erro"),
+                 _texto(d.get("mensagem")))
+                for ordem, d in enumerate(detalhes[inicio:inicio + TAMANHO_LOTE_GRAVACAO], start=inicio)
+            ]
+            _transacao(conn, (
+                "INSERT INTO job_linhas (job_id, ordem, linha, aba, id_produto, mac, serie, patrimonio_id, "
+                "status, mensagem) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", linhas, True))
+
+        _transacao(conn, (
+            "INSERT INTO jobs (job_id, usuario, arquivo, criado_em, status, total_linhas) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, usuario, arquivo, agora, resultado.get("status", "erro"), len(detalhes)), False))
+    except Exception:
+        # Remove as linhas já gravadas de um job que não vai aparecer
+        conn.execute("DELETE FROM job_linhas WHERE job_id = ?", (job_id,))
+        raise
+
+    return job_id
+
+
+def obter_job(job_id: str) -> Optional[Dict]:
+    linha = conexao_sqlite().execute(
+        "SELECT job_id, usuario, arquivo, criado_em, status, total_linhas FROM jobs WHERE job_id = ?",
+        (job_id,)
+    ).fetchone()
+    if linha is None:
+        return None
+    return dict(zip(("job_id", "usuario", "arquivo", "criado_em", "status", "total_linhas"), linha))
+
+
+def iterar_linhas(job_id: str) -> Iterator[tuple]:
+    """
+    Percorre as linhas do job em páginas de TAMANHO_PAGINA, na ordem original.
+    Cada página é lida por inteiro na conexão da thread atual, então o gerador
+    pode ser consumido de threads diferentes (StreamingResponse).
+    """
+    ultima_ordem = -1
+    while True:
+        pagina = conexao_sqlite().execute(
+            f"SELECT ordem, {', '.join(COLUNAS_LINHA)} FROM job_linhas "
+            "WHERE job_id = ? AND ordem > ? ORDER BY ordem LIMIT ?",
+            (job_id, ultima_ordem, TAMANHO_PAGINA)
+        ).fetchall()
+        if not pagina:
+            return
+        for linha in pagina:
+            yield linha[1:]
+        ultima_ordem = pagina[-1][0]
+
+
+def linhas_com_sucesso(desde: float) -> list:
+    """
+    Linhas gravadas com sucesso em jobs criados a partir de `desde` (timestamp),
+    da mais antiga para a mais recente. Usado na reconciliação com o banco.
+    """
+    cursor = conexao_sqlite().execute(
+        "SELECT j.job_id, j.usuario, j.criado_em, l.linha, l.aba, l.mac, l.serie, l.patrimonio_id "
+        "FROM job_linhas l JOIN jobs j ON j.job_id = l.job_id "
+        "WHERE j.criado_em >= ? AND l.status = 'sucesso' AND l.patrimonio_id IS NOT NULL "
+        "ORDER BY j.criado_em, l.ordem",
+        (desde,)
+    )
+    colunas = [c[0] for c in cursor.description]
+    return [dict(zip(colunas, linha)) for linha in cursor]
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from config import MULTIPROCESSO, METRICS_PUBLICAR_SEGUNDOS
+
+# Limites (em segundos) dos buckets dos histogramas. Cobrem desde uma consulta
+# rápida ao banco até um loop de PUTs de vários minutos.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+DESCRICOES = {
+    "patrimonio_etapa_duracao_segundos": "Duração de cada etapa do upload e das chamadas a DB/LDAP/IXC",
+    "patrimonio_etapa_erros_total": "Etapas interrompidas por exceção",
+    "patrimonio_uploads_total": "Uploads processados por status final",
+    "patrimonio_linhas_total": "Linhas de planilha processadas por status",
+    "http_requisicoes_total": "Requisições HTTP atendidas",
+    "http_requisicao_duracao_segundos": "Duração das requisições HTTP",
+}
+
+_trava = threading.Lock()
+# (nome, labels) -> [contagem por bucket..., contagem +Inf, soma]
+_histogramas: Dict[Tuple[str, tuple], list] = {}
+# (nome, labels) -> valor
+_contadores: Dict[Tuple[str, tuple], float] = {}
+
+# Spans da requisição atual, usados no header Server-Timing
+_spans_requisicao: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "spans_requisicao", default=None)
+
+logger = logging.getLogger("metrics")
+
+
+def _chave(nome: str, labels: dict) -> Tuple[str, tuple]:
+    return nome, tuple(sorted(labels.items()))
+
+
+def observar(nome: str, valor: float, **labels):
+    """Registra uma observação em um histograma."""
+    chave = _chave(nome, labels)
+    posicao = len(BUCKETS)
+    for i, limite in enumerate(BUCKETS):
+        if valor <= limite:
+            posicao = i
+            break
+
+    with _trava:
+        serie = _histogramas.get(chave)
+        if serie is None:
+            serie = _histogramas[chave] = [0] * (len(BUCKETS) + 1) + [0.0]
+        serie[posicao] += 1
+        serie[-1] += valor
+
+
+def incrementar(nome: str, valor: float = 1, **labels):
+    """Incrementa um contador."""
+    chave = _chave(nome, labels)
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+@contextmanager
+def medir(etapa: str, span: bool = True):
+    """
+    Mede a duração de um bloco e registra em patrimonio_etapa_duracao_segundos.
+    Se houver uma requisição em andamento, o span também vai para o Server-Timing
+    (use span=False em blocos executados uma vez por linha, como cada PUT).
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        incrementar("patrimonio_etapa_erros_total", etapa=etapa)
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        observar("patrimonio_etapa_duracao_segundos", duracao, etapa=etapa)
+        spans = _spans_requisicao.get() if span else None
+        if spans is not None:
+            spans.append((etapa, duracao))
+
+
+def iniciar_spans():
+    """Começa a coletar os spans da requisição atual. Retorna o token do contexto."""
+    return _spans_requisicao.set([])
+
+
+def encerrar_spans(token) -> List[Tuple[str, float]]:
+    """Para a coleta e devolve os spans registrados desde `iniciar_spans`."""
+    spans = _spans_requisicao.get() or []
+    _spans_requisicao.reset(token)
+    return spans
+
+
+def header_server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Formata os spans no padrão do header Server-Timing (durações em ms)."""
+    return ", ".join(f"{etapa};dur={duracao * 1000:.1f}" for etapa, duracao in spans)
+
+
+# ----------------- MODO MULTIPROCESSO -----------------
+# Cada worker publica periodicamente seu snapshot no SQLite compartilhado e o
+# /metrics soma os snapshots de todos, já que o scrape cai em um worker qualquer.
+# A publicação roda em uma thread própria, nunca no event loop das requisições.
+_processo: Optional[Tuple[int, str]] = None
+_parar_publicacao = threading.Event()
+
+
+def _id_processo() -> str:
+    # pid + instante de criação: um pid reaproveitado não sobrescreve o worker antigo
+    global _processo
+    if _processo is None or _processo[0] != os.getpid():
+        _processo = (os.getpid(), f"{os.getpid()}-{time.time_ns()}")
+    return _processo[1]
+
+
+def _snapshot():
+    with _trava:
+        return dict(_contadores), {k: list(v) for k, v in _histogramas.items()}
+
+
+def publicar():
+    """
+    Grava o snapshot deste worker no SQLite. Falhas (ex.: banco travado) só geram
+    aviso: métricas nunca devem derrubar uma requisição.
+    """
+    if not MULTIPROCESSO:
+        return
+
+    from services.cache import conexao_sqlite
+
+    contadores, histogramas = _snapshot()
+    dados = json.dumps({
+        "contadores": [[nome, labels, valor] for (nome, labels), valor in contadores.items()],
+        "histogramas": [[nome, labels, serie] for (nome, labels), serie in histogramas.items()],
+    })
+    try:
+        conexao_sqlite().execute(
+            "INSERT OR REPLACE INTO metricas_processos (processo, atualizado_em, dados) VALUES (?, ?, ?)",
+            (_id_processo(), time.time(), dados)
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"Não foi possível publicar as métricas deste worker: {e}")
+
+
+def _publicar_periodicamente():
+    while not _parar_publicacao.wait(METRICS_PUBLICAR_SEGUNDOS):
+        publicar()
+
+
+def iniciar_publicacao():
+    """Inicia a thread que publica o snapshot a cada METRICS_PUBLICAR_SEGUNDOS (chamado no lifespan)."""
+    if not MULTIPROCESSO:
+        return
+    _parar_publicacao.clear()
+    threading.Thread(target=_publicar_periodicamente, name="publicacao-metricas", daemon=True).start()
+
+
+def parar_publicacao():
+    """Encerra a thread e publica o snapshot final (worker reciclado ou desligando)."""
+    if not MULTIPROCESSO:
+        return
+    _parar_publicacao.set()
+    publicar()
+
+
+def _agregar_processos():
+    """Soma os snapshots de todos os workers (inclusive os já reciclados)."""
+    from services.cache import conexao_sqlite
+
+    contadores: Dict[Tuple[str, tuple], float] = {}
+    histogramas: Dict[Tuple[str, tuple], list] = {}
+    for (dados,) in conexao_sqlite().execute("SELECT dados FROM metricas_processos"):
+        dados = json.loads(dados)
+        for nome, labels, valor in dados["contadores"]:
+            chave = (nome, tuple(tuple(par) for par in labels))
+            contadores[chave] = contadores.get(chave, 0) + valor
+        for nome, labels, serie in dados["histogramas"]:
+            chave = (nome, tuple(tuple(par) for par in labels))
+            atual = histogramas.get(chave)
+            histogramas[chave] = serie if atual is None else [a + b for a, b in zip(atual, serie)]
+    return contadores, histogramas
+
+
+def limpar_compartilhadas():
+    """Zera os snapshots ao subir o serviço (chamado pelo master do gunicorn)."""
+    from services.cache import abrir_sqlite
+
+    conn = abrir_sqlite()
+    try:
+        conn.execute("DELETE FROM metricas_processos")
+    finally:
+        conn.close()
+
+
+def _formatar_labels(labels: tuple, extra: Optional[tuple] = None) -> str:
+    itens = list(labels) + ([extra] if extra else [])
+    if not itens:
+        return ""
+    conteudo = ",".join(f'{k}="{str(v)}"' for k, v in itens)
+    return "{" + conteudo + "}"
+
+
+def render_prometheus() -> str:
+    """Exporta contadores e histogramas no formato texto do Prometheus."""
+    contadores, histogramas = None, None
+    if MULTIPROCESSO:
+        publicar()
+        try:
+            contadores, histogramas = _agregar_processos()
+        except sqlite3.Error as e:
+            logger.warning(f"Métricas dos outros workers indisponíveis ({e}); exportando só este worker")
+    if contadores is None:
+        contadores, histogramas = _snapshot()
+
+    linhas = []
+    declarados = set()
+
+    def declarar(nome, tipo):
+        if nome not in declarados:
+            declarados.add(nome)
+            linhas.append(f"# HELP {nome} {DESCRICOES.get(nome, nome)}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+    for (nome, labels), valor in sorted(contadores.items()):
+        declarar(nome, "counter")
+        linhas.append(f"{nome}{_formatar_labels(labels)} {valor}")
+
+    for (nome, labels), serie in sorted(histogramas.items()):
+        declarar(nome, "histogram")
+        acumulado = 0
+        for limite, contagem in zip(BUCKETS, serie):
+            acumulado += contagem
+            linhas.append(f"{nome}_bucket{_formatar_labels(labels, ('le', limite))} {acumulado}")
+        acumulado += serie[len(BUCKETS)]
+        linhas.append(f"{nome}_bucket{_formatar_labels(labels, ('le', '+Inf'))} {acumulado}")
+        linhas.append(f"{nome}_sum{_formatar_labels(labels)} {serie[-1]}")
+        linhas.append(f"{nome}_count{_formatar_labels(labels)} {acumulado}")
+
+    return "\n".join(linhas) + "\n"
@@ -1,9 +1,16 @@
+from __future__ import annotations
+
 import datetime
 import json
-import requests
 from config import API_BASE_URL, basic_auth_header, IXC_SESSION
-from typing import Dict
-import pandas as pd
+from typing import Dict, TYPE_CHECKING
+from services.metrics import medir, incrementar
+from services.validations import COLUNA_LINHA_ORIGEM, COLUNA_ABA_ORIGEM
+
+# pandas e requests são importados sob demanda: carregá-los no import do módulo
+# atrasa o boot de cada worker
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def _normalizar_patrimonios(patrimonios, logger):
@@ -94,7 +101,10 @@ def _normalizar_patrimonios(patrimonios, logger):
     # Se veio lista
     if isinstance(patrimonios, list):
         for item in patrimonios:
-            if isinstance(item, dict):
+            if item is None:
+                # Vaga sem patrimônio (lote com estoque menor que as linhas do produto)
+                normalizados.append(None)
+            elif isinstance(item, dict):
                 normalizados.append(item)
             elif isinstance(item, (int, float)):
                 normalizados.append({"id": str(int(item))})
@@ -119,6 +129,42 @@ def _normalizar_patrimonios(patrimonios, logger):
     return normalizados
 
 
+def _identificar_linha(i, row) -> Dict:
+    """
+    Identificação da linha no resultado, com o MAC e a série originais. Em lotes
+    usa a linha/aba originais (colunas internas criadas por validar_planilha_lote)
+    e informa o produto; no upload simples mantém a posição + 1.
+    """
+    if COLUNA_LINHA_ORIGEM in row:
+        identificacao = {"linha": int(row[COLUNA_LINHA_ORIGEM]), "aba": row.get(COLUNA_ABA_ORIGEM),
+                         "id_produto": row.get("id_produto")}
+    else:
+        identificacao = {"linha": i + 1}
+    identificacao["mac"] = str(row.get("mac") or "").strip()
+    identificacao["serie"] = str(row.get("serie") or "").strip()
+    return identificacao
+
+
+def id_patrimonio(item):
+    """Id de um registro de patrimônio já normalizado (dict, id simples ou None)."""
+    if isinstance(item, dict):
+        return str(item.get("id") or item.get("ID") or "") or None
+    return None if item is None else str(item)
+
+
+def montar_plano(df: pd.DataFrame, patrimonios: list, logger) -> list:
+    """
+    Devolve a atribuição linha -> patrimônio que processar_arquivo executaria
+    com os mesmos dados, sem fazer nenhum PUT.
+    """
+    patrimonios = _normalizar_patrimonios(patrimonios, logger)
+    plano = []
+    for i, row in df.iterrows():
+        item = patrimonios[i] if i < len(patrimonios) else None
+        plano.append({**_identificar_linha(i, row), "patrimonio_id": id_patrimonio(item)})
+    return plano
+
+
 def processar_arquivo(df: pd.DataFrame, patrimonios: list, logger) -> Dict:
     """
     Atualiza os patrimônios via API. Recebe DataFrame validado e lista de patrimônios disponíveis.
@@ -139,78 +185,85 @@ def processar_arquivo(df: pd.DataFrame, patrimonios: list, logger) -> Dict:
     # 🔒 Normaliza os registros para garantir que sejam sempre dicionários
     patrimonios = _normalizar_patrimonios(patrimonios, logger)
 
-    for i, row in df.iterrows():
-        if i >= len(patrimonios):
-            resultados_detalhados.append({
-                "linha": i + 1,
-                "id": None,
-                "status": "erro",
-                "mensagem": "Sem patrimônio disponível"
-            })
-            continue
+    with medir("ixc_put_loop"):
+        for i, row in df.iterrows():
+            linha = {"linha": i + 1}
+            try:
+                linha = _identificar_linha(i, row)
+                if i >= len(patrimonios) or patrimonios[i] is None:
+                    resultados_detalhados.append({
+                        **linha,
+                        "id": None,
+                        "status": "erro",
+                        "mensagem": "Sem patrimônio disponível"
+                    })
+                    continue
 
-        try:
-            item = patrimonios[i]
-            if isinstance(item, dict):
-                patrimonio = item.copy()
-                patrimonio_id = str(patrimonio.get(
-                    "id") or patrimonio.get("ID") or "")
-            else:
-                patrimonio_id = str(item)
-                patrimonio = {"id": patrimonio_id}
-
-            if not patrimonio_id:
-                raise ValueError(
-                    f"Registro de patrimônio sem 'id' na posição {i}")
-
-            patrimonio["id_mac"] = row.get("mac", "").strip()
-            patrimonio["serial_fornecedor"] = row.get("serie", "").strip()
-            patrimonio["data_aquisicao"] = datetime.datetime.now().strftime(
-                "%d/%m/%Y")
-
-            url_put = f"{API_BASE_URL}/{patrimonio_id}"
-            response_put = requests.put(
-                url_put,
-                headers=headers_put,
-                data=json.dumps(patrimonio),
-                timeout=30
-            )
-
-            if response_put.status_code == 200 and '"type":"success"' in response_put.text:
-                resultados_detalhados.append({
-                    "linha": i + 1,
-                    "id": patrimonio_id,
-                    "status": "sucesso",
-                    "mensagem": "Atualizado com sucesso"
-                })
-                logger.info(
-                    f"✅ Patrimônio {patrimonio_id} atualizado com sucesso (linha {i+1})")
-            else:
-                try:
-                    msg_erro = response_put.json().get("message", response_put.text)
-                except Exception:
-                    msg_erro = response_put.text
+                item = patrimonios[i]
+                if isinstance(item, dict):
+                    patrimonio = item.copy()
+                    patrimonio_id = str(patrimonio.get(
+                        "id") or patrimonio.get("ID") or "")
+                else:
+                    patrimonio_id = str(item)
+                    patrimonio = {"id": patrimonio_id}
+
+                if not patrimonio_id:
+                    raise ValueError(
+                        f"Registro de patrimônio sem 'id' na posição {i}")
+
+                patrimonio["id_mac"] = row.get("mac", "").strip()
+                patrimonio["serial_fornecedor"] = row.get("serie", "").strip()
+                patrimonio["data_aquisicao"] = datetime.datetime.now().strftime(
+                    "%d/%m/%Y")
+
+                url_put = f"{API_BASE_URL}/{patrimonio_id}"
+                with medir("ixc_put", span=False):
+                    response_put = requests.put(
+                        url_put,
+                        headers=headers_put,
+                        data=json.dumps(patrimonio),
+                        timeout=30
+                    )
+
+                if response_put.status_code == 200 and '"type":"success"' in response_put.text:
+                    resultados_detalhados.append({
+                        **linha,
+                        "id": patrimonio_id,
+                        "status": "sucesso",
+                        "mensagem": "Atualizado com sucesso"
+                    })
+                    logger.info(
+                        f"✅ Patrimônio {patrimonio_id} atualizado com sucesso (linha {i+1})")
+                else:
+                    try:
+                        msg_erro = response_put.json().get("message", response_put.text)
+                    except Exception:
+                        msg_erro = response_put.text
+                    resultados_detalhados.append({
+                        **linha,
+                        "id": patrimonio_id,
+                        "status": "erro",
+                        "mensagem": msg_erro
+                    })
+                    logger.warning(
+                        f"❌ Erro ao atualizar patrimônio {patrimonio_id} (linha {i+1}): {msg_erro}")
+
+            except Exception as e:
                 resultados_detalhados.append({
-                    "linha": i + 1,
-                    "id": patrimonio_id,
+                    **linha,
+                    "id": None,
                     "status": "erro",
-                    "mensagem": msg_erro
+                    "mensagem": str(e)
                 })
-                logger.warning(
-                    f"❌ Erro ao atualizar patrimônio {patrimonio_id} (linha {i+1}): {msg_erro}")
-
-        except Exception as e:
-            resultados_detalhados.append({
-                "linha": i + 1,
-                "id": None,
-                "status": "erro",
-                "mensagem": str(e)
-            })
-            logger.exception(
-                f"❌ Exceção ao atualizar patrimônio na linha {i+1}: {e}")
+                logger.exception(
+                    f"❌ Exceção ao atualizar patrimônio na linha {i+1}: {e}")
 
     status_geral = "sucesso" if all(
         r["status"] == "sucesso" for r in resultados_detalhados) else "erro"
+    sucessos = sum(1 for r in resultados_detalhados if r["status"] == "sucesso")
+    incrementar("patrimonio_linhas_total", sucessos, status="sucesso")
+    incrementar("patrimonio_linhas_total", len(resultados_detalhados) - sucessos, status="erro")
     logger.info(
         f"📦 Resultado final do processamento: {json.dumps(resultados_detalhados, ensure_ascii=False, indent=2)}")
     return {"status": status_geral, "detalhes": resultados_detalhados}
@@ -0,0 +1,153 @@
+"""
+Reconciliação entre os uploads recentes e o estado real da tabela patrimonio.
+
+Para cada linha gravada com sucesso nos últimos N dias (jobs do SQLite compartilhado),
+confere no banco:
+- patrimonio_inexistente: o patrimônio atribuído não existe mais;
+- nao_persistido: o PUT respondeu sucesso, mas MAC e série continuam vazios;
+- divergente: MAC ou série no banco diferem do que foi enviado;
+- mac_duplicado / serie_duplicada: outro patrimônio passou a usar o mesmo valor
+  (cadastrado fora desta ferramenta).
+
+As comparações são feitas em conjunto: três consultas em lote (por id, por MAC e
+por série), sem consulta por linha. Pensado para rodar via cron:
+
+    python -m services.reconciliacao --dias 30
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from logger_config import ArquivoDiarioHandler, FORMATO_SISTEMA, FORMATO_DATA
+from services.jobs import linhas_com_sucesso
+from services.metrics import medir
+from services.validations import conexao_banco, buscar_patrimonios_por
+
+logger = logging.getLogger("reconciliacao")
+
+RELATORIOS_DIR = "relatorios"
+RECONCILIACAO_LOG_DIR = "logs/reconciliacao"
+COLUNAS_RELATORIO = ["tipo", "job_id", "usuario", "data_upload", "linha", "aba",
+                     "patrimonio_id", "mac", "serie", "no_banco"]
+
+
+def _normalizar(valor) -> str:
+    return str(valor or "").strip().lower()
+
+
+def _discrepancia(tipo: str, linha: dict, no_banco: str) -> dict:
+    return {
+        "tipo": tipo,
+        "job_id": linha["job_id"],
+        "usuario": linha["usuario"],
+        "data_upload": datetime.fromtimestamp(linha["criado_em"]).strftime("%d/%m/%Y %H:%M"),
+        "linha": linha["linha"],
+        "aba": linha["aba"],
+        "patrimonio_id": linha["patrimonio_id"],
+        "mac": linha["mac"],
+        "serie": linha["serie"],
+        "no_banco": no_banco,
+    }
+
+
+def _agrupar_ids(registros: list, coluna: str) -> dict:
+    """{valor normalizado: {ids de patrimônio com esse valor}}."""
+    grupos = defaultdict(set)
+    for r in registros:
+        grupos[_normalizar(r[coluna])].add(str(r["id"]))
+    return grupos
+
+
+def reconciliar(dias: int) -> list:
+    """Devolve a lista de discrepâncias dos uploads dos últimos `dias` dias."""
+    # Um mesmo patrimônio enviado mais de uma vez: vale o upload mais recente
+    linhas = {}
+    for linha in linhas_com_sucesso(time.time() - dias * 86400):
+        linhas[str(linha["patrimonio_id"])] = linha
+    if not linhas:
+        return []
+
+    with medir("reconciliacao_banco"), conexao_banco() as conn:
+        por_id = {str(r["id"]): r for r in buscar_patrimonios_por(conn, "id", linhas)}
+        por_mac = _agrupar_ids(
+            buscar_patrimonios_por(conn, "id_mac", (l["mac"] for l in linhas.values())), "id_mac")
+        por_serie = _agrupar_ids(
+            buscar_patrimonios_por(conn, "serial_fornecedor", (l["serie"] for l in linhas.values())),
+            "serial_fornecedor")
+
+    discrepancias = []
+    for patrimonio_id, linha in linhas.items():
+        atual = por_id.get(patrimonio_id)
+        if atual is None:
+            discrepancias.append(_discrepancia("patrimonio_inexistente", linha, ""))
+            continue
+
+        mac_banco, serie_banco = _normalizar(atual["id_mac"]), _normalizar(atual["serial_fornecedor"])
+        if not mac_banco and not serie_banco:
+            discrepancias.append(_discrepancia("nao_persistido", linha, ""))
+        elif mac_banco != _normalizar(linha["mac"]) or serie_banco != _normalizar(linha["serie"]):
+            discrepancias.append(_discrepancia(
+                "divergente", linha, f"{atual['id_mac'] or ''} / {atual['serial_fornecedor'] or ''}"))
+
+        outros_mac = por_mac.get(_normalizar(linha["mac"]), set()) - {patrimonio_id}
+        if linha["mac"] and outros_mac:
+            discrepancias.append(_discrepancia("mac_duplicado", linha, ",".join(sorted(outros_mac))))
+
+        outros_serie = por_serie.get(_normalizar(linha["serie"]), set()) - {patrimonio_id}
+        if linha["serie"] and outros_serie:
+            discrepancias.append(_discrepancia("serie_duplicada", linha, ",".join(sorted(outros_serie))))
+
+    logger.info(f"🔁 Reconciliação: {len(linhas)} patrimônios verificados, "
+                f"{len(discrepancias)} discrepância(s)")
+    return discrepancias
+
+
+def gravar_relatorio(discrepancias: list, diretorio: str = RELATORIOS_DIR) -> str:
+    """Grava as discrepâncias em <diretorio>/reconciliacao_AAAAMMDD_HHMMSS.csv."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"reconciliacao_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    with open(caminho, "w", newline="", encoding="utf-8-sig") as f:
+        escritor = csv.DictWriter(f, fieldnames=COLUNAS_RELATORIO, delimiter=";")
+        escritor.writeheader()
+        escritor.writerows(discrepancias)
+    return caminho
+
+
+def _configurar_log():
+    """
+    Log próprio em logs/reconciliacao: os arquivos de logs/sistema são escritos
+    só pelo listener do master do gunicorn, e este processo roda fora dele (cron).
+    """
+    handler = ArquivoDiarioHandler(RECONCILIACAO_LOG_DIR, "reconciliacao")
+    handler.setFormatter(logging.Formatter(FORMATO_SISTEMA, datefmt=FORMATO_DATA))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcilia os uploads recentes com a tabela patrimonio")
+    parser.add_argument("--dias", type=int, default=30, help="janela de uploads verificados (padrão 30)")
+    parser.add_argument("--saida", default=RELATORIOS_DIR, help="diretório do relatório CSV")
+    args = parser.parse_args()
+
+    _configurar_log()
+    inicio = time.perf_counter()
+    discrepancias = reconciliar(args.dias)
+    caminho = gravar_relatorio(discrepancias, args.saida)
+
+    print(json.dumps({
+        "dias": args.dias,
+        "discrepancias": dict(Counter(d["tipo"] for d in discrepancias)),
+        "relatorio": caminho,
+        "duracao_segundos": round(time.perf_counter() - inicio, 2),
+    }, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,138 @@
-import pandas as pd
+from __future__ import annotations
+
+import contextvars
 import json
-import requests
-from config import API_BASE_URL, basic_auth_header, IXC_SESSION, DB_CONFIG
-from typing import Dict
-import mysql.connector
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config import API_BASE_URL, basic_auth_header, IXC_SESSION, DB_CONFIG, ESTOQUE_PARALELISMO
+from typing import Dict, Iterable, TYPE_CHECKING
 import logging
+from services.metrics import medir
+from services import indice_duplicidade
+
+# pandas, requests e mysql.connector são importados dentro das funções que os
+# usam, para não pesar no import da aplicação
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger("validations")
 
+COLUNAS_OBRIGATORIAS = ["mac", "serie"]
 
-def validar_duplicidade_ixc(df: pd.DataFrame) -> Dict:
+# Colunas internas com a linha/aba de origem de cada linha de um lote. Nomes
+# reservados para não confundir com colunas "linha"/"aba" da própria planilha.
+COLUNA_LINHA_ORIGEM = "_linha_origem"
+COLUNA_ABA_ORIGEM = "_aba_origem"
+
+# Colunas de patrimonio aceitas em buscar_patrimonios_por e valores por consulta "IN (...)"
+COLUNAS_BUSCA_PATRIMONIO = ("id", "id_mac", "serial_fornecedor")
+TAMANHO_BLOCO_BANCO = 5000
+
+
+def _erro_linha(idx, row, mensagem: str) -> Dict:
     """
-    Valida se algum MAC ou série do DataFrame já está cadastrado no IXC via banco de dados.
-    Retorna erros detalhados com linha, valor duplicado, id do patrimônio e id_produto.
+    Monta o erro de uma linha. Em lotes a linha e a aba originais vêm das colunas
+    internas COLUNA_LINHA_ORIGEM/COLUNA_ABA_ORIGEM; nas demais planilhas, a linha
+    é a posição + 2 (cabeçalho).
     """
+    if COLUNA_LINHA_ORIGEM in row:
+        return {"linha": int(row[COLUNA_LINHA_ORIGEM]), "aba": row.get(COLUNA_ABA_ORIGEM), "mensagem": mensagem}
+    return {"linha": idx + 2, "mensagem": mensagem}
+
+
+@contextmanager
+def conexao_banco():
+    """Conexão com o banco do IXC (DB_CONFIG), fechada ao sair do bloco."""
+    import mysql.connector
+
+    conn = mysql.connector.connect(**DB_CONFIG)
     try:
-        logger.info("Conectando ao banco para validar duplicidades IXC")
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
+        yield conn
+    finally:
+        conn.close()
+
+
+def buscar_patrimonios_por(conn, coluna: str, valores: Iterable) -> list:
+    """
+    Busca em lote os patrimônios cuja `coluna` está entre `valores`, com uma
+    consulta "IN (...)" a cada TAMANHO_BLOCO_BANCO valores.
+    """
+    if coluna not in COLUNAS_BUSCA_PATRIMONIO:
+        raise ValueError(f"Coluna de busca inválida: {coluna}")
+
+    valores = [v for v in set(valores) if v]
+    registros = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        for inicio in range(0, len(valores), TAMANHO_BLOCO_BANCO):
+            bloco = valores[inicio:inicio + TAMANHO_BLOCO_BANCO]
+            marcadores = ",".join(["%s"] * len(bloco))
+            cursor.execute(
+                f"SELECT id, id_produto, id_mac, serial_fornecedor FROM patrimonio "
+                f"WHERE {coluna} IN ({marcadores})",
+                bloco
+            )
+            registros.extend(cursor.fetchall())
+    finally:
+        cursor.close()
+    return registros
+
 
-        query = """
-            SELECT id, id_produto, id_mac, serial_fornecedor
-            FROM patrimonio
-            WHERE id_mac IS NOT NULL AND id_mac != ''
-              AND serial_fornecedor IS NOT NULL AND serial_fornecedor != ''
-        """
+def _carregar_patrimonios_cadastrados() -> list:
+    """Lê do banco todos os patrimônios com MAC e série preenchidos."""
+    logger.info("Conectando ao banco para validar duplicidades IXC")
+    query = """
+        SELECT id, id_produto, id_mac, serial_fornecedor
+        FROM patrimonio
+        WHERE id_mac IS NOT NULL AND id_mac != ''
+          AND serial_fornecedor IS NOT NULL AND serial_fornecedor != ''
+    """
+    with medir("db_duplicidade"), conexao_banco() as conn:
+        cursor = conn.cursor(dictionary=True)
         cursor.execute(query)
         registros = cursor.fetchall()
         cursor.close()
-        conn.close()
-        logger.info(
-            f"{len(registros)} registros de patrimônio carregados do banco")
+    logger.info(
+        f"{len(registros)} registros de patrimônio carregados do banco")
+    return registros
+
+
+def validar_duplicidade_ixc(df: pd.DataFrame) -> Dict:
+    """
+    Valida se algum MAC ou série do DataFrame já está cadastrado no IXC via banco de dados.
+    Retorna erros detalhados com linha, valor duplicado, id do patrimônio e id_produto.
+    Com o índice compartilhado ativo, o banco só é relido quando o índice expira.
+    """
+    import mysql.connector
 
-        macs_existentes = {r["id_mac"]: (
-            r["id"], r["id_produto"]) for r in registros if r["id_mac"]}
-        series_existentes = {r["serial_fornecedor"]: (
-            r["id"], r["id_produto"]) for r in registros if r["serial_fornecedor"]}
+    try:
+        if indice_duplicidade.ativo():
+            with medir("indice_duplicidade"):
+                macs_existentes, series_existentes = indice_duplicidade.consultar(
+                    df.get("mac", []), df.get("serie", []), _carregar_patrimonios_cadastrados)
+        else:
+            registros = _carregar_patrimonios_cadastrados()
+            macs_existentes = {r["id_mac"]: (
+                r["id"], r["id_produto"]) for r in registros if r["id_mac"]}
+            series_existentes = {r["serial_fornecedor"]: (
+                r["id"], r["id_produto"]) for r in registros if r["serial_fornecedor"]}
 
         erros = []
 
         for idx, row in df.iterrows():
-            linha_num = idx + 2
             mac = row.get("mac")
             serie = row.get("serie")
 
             if mac in macs_existentes:
                 patr_id, produto_id = macs_existentes[mac]
-                erros.append({
-                    "linha": linha_num,
-                    "mensagem": f"MAC '{mac}' já cadastrado no patrimônio {patr_id}, produto {produto_id}"
-                })
+                erros.append(_erro_linha(
+                    idx, row, f"MAC '{mac}' já cadastrado no patrimônio {patr_id}, produto {produto_id}"))
 
             if serie in series_existentes:
                 patr_id, produto_id = series_existentes[serie]
-                erros.append({
-                    "linha": linha_num,
-                    "mensagem": f"Série '{serie}' já cadastrado no patrimônio {patr_id}, produto {produto_id}"
-                })
+                erros.append(_erro_linha(
+                    idx, row, f"Série '{serie}' já cadastrado no patrimônio {patr_id}, produto {produto_id}"))
 
         if erros:
             logger.warning(
@@ -75,21 +151,32 @@ def validar_planilha(path_arquivo: str, logger) -> Dict:
     Valida o XLSX recebido: primeiro verifica duplicidade no IXC,
     depois colunas obrigatórias, campos preenchidos e duplicatas internas.
     """
+    import pandas as pd
+
     try:
-        df = pd.read_excel(path_arquivo, dtype=str).fillna("")
+        with medir("excel_leitura"):
+            df = pd.read_excel(path_arquivo, dtype=str).fillna("")
         logger.info(f"Colunas lidas: {df.columns.tolist()}")
         logger.info(f"Quantidade de linhas: {len(df)}")
     except Exception as e:
         logger.exception(f"Erro ao ler o arquivo Excel: {e}")
         return {"status": "erro", "detalhes": [{"linha": None, "mensagem": f"Erro ao abrir arquivo: {e}"}]}
 
+    return _validar_dados(df, logger)
+
+
+def _validar_dados(df: pd.DataFrame, logger) -> Dict:
+    """
+    Regras comuns ao upload simples e ao lote: duplicidade no IXC,
+    colunas obrigatórias, campos preenchidos e duplicatas internas.
+    """
     # Primeira validação: duplicidade no IXC
     resultado_ixc = validar_duplicidade_ixc(df)
     if resultado_ixc["status"] != "sucesso":
         return resultado_ixc
 
     # Validação interna da planilha
-    colunas_obrigatorias = ["mac", "serie"]
+    colunas_obrigatorias = COLUNAS_OBRIGATORIAS
     colunas_faltando = [c for c in colunas_obrigatorias if c not in df.columns]
 
     if colunas_faltando:
@@ -103,14 +190,12 @@ def validar_planilha(path_arquivo: str, logger) -> Dict:
         erros_linha = [
             f"Campo obrigatório vazio: {col}" for col in colunas_obrigatorias if not row[col]]
         if erros_linha:
-            detalhes_erros.append(
-                {"linha": idx + 2, "mensagem": "; ".join(erros_linha)})
+            detalhes_erros.append(_erro_linha(idx, row, "; ".join(erros_linha)))
 
     for col in colunas_obrigatorias:
         duplicados = df[df.duplicated([col], keep=False)]
         for idx, row in duplicados.iterrows():
-            detalhes_erros.append(
-                {"linha": idx + 2, "mensagem": f"Duplicado na coluna {col}: {row[col]}"})
+            detalhes_erros.append(_erro_linha(idx, row, f"Duplicado na coluna {col}: {row[col]}"))
 
     if detalhes_erros:
         logger.warning(f"{len(detalhes_erros)} erros encontrados na planilha.")
@@ -119,11 +204,75 @@ def validar_planilha(path_arquivo: str, logger) -> Dict:
     return {"status": "sucesso", "dados": df}
 
 
+def _id_produto_da_aba(nome_aba: str) -> str:
+    """Extrai o id do produto do nome da aba ("123" ou "123 - ONU GPON")."""
+    encontrado = re.match(r"\s*(\d+)", str(nome_aba))
+    return encontrado.group(1) if encontrado else ""
+
+
+def validar_planilha_lote(path_arquivo: str, logger) -> Dict:
+    """
+    Valida um upload em lote, com vários produtos no mesmo arquivo.
+    O produto de cada linha vem da coluna "id_produto" ou, na falta dela,
+    do nome da aba. Todas as abas são unidas em um único DataFrame com as
+    colunas "id_produto", COLUNA_ABA_ORIGEM e COLUNA_LINHA_ORIGEM (linha original na aba).
+    """
+    import pandas as pd
+
+    try:
+        with medir("excel_leitura"):
+            abas = pd.read_excel(path_arquivo, sheet_name=None, dtype=str)
+    except Exception as e:
+        logger.exception(f"Erro ao ler o arquivo Excel: {e}")
+        return {"status": "erro", "detalhes": [{"linha": None, "mensagem": f"Erro ao abrir arquivo: {e}"}]}
+
+    partes = []
+    detalhes_erros = []
+    for nome_aba, df_aba in abas.items():
+        df_aba = df_aba.fillna("")
+        if df_aba.empty:
+            continue
+
+        if "id_produto" in df_aba.columns:
+            df_aba["id_produto"] = df_aba["id_produto"].str.strip()
+            for idx in df_aba.index[df_aba["id_produto"] == ""]:
+                detalhes_erros.append({"linha": idx + 2, "aba": nome_aba,
+                                       "mensagem": "Campo obrigatório vazio: id_produto"})
+        else:
+            id_produto = _id_produto_da_aba(nome_aba)
+            if not id_produto:
+                detalhes_erros.append({
+                    "linha": None, "aba": nome_aba,
+                    "mensagem": f"Aba '{nome_aba}' sem coluna id_produto e o nome não é um id de produto"
+                })
+                continue
+            df_aba["id_produto"] = id_produto
+
+        df_aba[COLUNA_ABA_ORIGEM] = nome_aba
+        df_aba[COLUNA_LINHA_ORIGEM] = df_aba.index + 2
+        partes.append(df_aba)
+
+    if detalhes_erros:
+        logger.warning(f"{len(detalhes_erros)} erros de produto encontrados no lote.")
+        return {"status": "erro", "detalhes": detalhes_erros}
+
+    if not partes:
+        return {"status": "erro", "detalhes": [{"linha": None, "mensagem": "Planilha sem linhas"}]}
+
+    df = pd.concat(partes, ignore_index=True).fillna("")
+    logger.info(f"Lote com {len(df)} linhas em {len(partes)} aba(s) e "
+                f"{df['id_produto'].nunique()} produto(s)")
+
+    return _validar_dados(df, logger)
+
+
 def validar_estoque(df: pd.DataFrame, id_produto: str, logger) -> Dict:
     """
     Verifica se há patrimônio suficiente para atualizar.
     Retorna dict com status e lista de patrimônios disponíveis.
     """
+    import requests
+
     logger.info(
         f"🧩 Iniciando validação de estoque para id_produto={id_produto}")
     qtd_equipamentos = len(df)
@@ -169,8 +318,9 @@ def validar_estoque(df: pd.DataFrame, id_produto: str, logger) -> Dict:
     # }
 
     try:
-        response = requests.get(
-            API_BASE_URL, headers=headers_get, json=payload_get, timeout=30)
+        with medir("ixc_estoque_get"):
+            response = requests.get(
+                API_BASE_URL, headers=headers_get, json=payload_get, timeout=30)
     except Exception as e:
         logger.exception(f"Falha na requisição GET: {e}")
         return {"status": "erro", "detalhes": [{"linha": None, "mensagem": str(e)}]}
@@ -225,3 +375,36 @@ def validar_estoque(df: pd.DataFrame, id_produto: str, logger) -> Dict:
         f"📦 Estoque retornado (total={total_disponivel}): {json.dumps(patrimonios[:3], ensure_ascii=False)}")
 
     return {"status": "sucesso", "patrimonios": patrimonios}
+
+
+def validar_estoque_lote(grupos: Dict[str, pd.DataFrame], logger) -> Dict:
+    """
+    Executa validar_estoque para cada produto do lote em paralelo.
+    Retorna dict com status e, em caso de sucesso, os patrimônios por id_produto.
+    """
+    if not grupos:
+        return {"status": "sucesso", "patrimonios": {}}
+
+    workers = min(len(grupos), ESTOQUE_PARALELISMO)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # O executor não propaga contextvars: cada tarefa roda em uma cópia do
+        # contexto atual para que os spans "ixc_estoque_get" cheguem ao Server-Timing
+        futuros = {
+            id_produto: executor.submit(
+                contextvars.copy_context().run, validar_estoque, df_grupo, id_produto, logger)
+            for id_produto, df_grupo in grupos.items()
+        }
+        resultados = {id_produto: futuro.result() for id_produto, futuro in futuros.items()}
+
+    detalhes_erros = []
+    for id_produto, resultado in resultados.items():
+        if resultado["status"] != "sucesso":
+            for erro in resultado["detalhes"]:
+                detalhes_erros.append({**erro, "id_produto": id_produto,
+                                       "mensagem": f"Produto {id_produto}: {erro['mensagem']}"})
+
+    if detalhes_erros:
+        return {"status": "erro", "detalhes": detalhes_erros}
+
+    return {"status": "sucesso",
+            "patrimonios": {id_produto: r["patrimonios"] for id_produto, r in resultados.items()}}
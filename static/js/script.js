@@ -8,6 +8,7 @@ document.addEventListener('DOMContentLoaded', () => {
   const inputFile = document.getElementById('file');
   const fileNameEl = document.getElementById('file-name');
   const fileRemoveBtn = document.getElementById('file-remove');
+  const simularBtn = document.getElementById('simular');
 
   if (!form || !inputProduto || !autocompleteList || !mensagemEl || !loadingEl || !inputFile || !fileNameEl) {
     console.error("Algum elemento obrigatório não foi encontrado no DOM");
@@ -109,38 +110,104 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   });
 
-  // ----------------- Submit -----------------
-  form.addEventListener('submit', async (e) => {
-    e.preventDefault();
+  // ----------------- Mensagens -----------------
+  function mostrarMensagem(classe, texto) {
+    mensagemEl.className = classe;
+    mensagemEl.style.display = 'block';
+    mensagemEl.textContent = texto;
+  }
+
+  function mostrarResultado(data) {
+    if (data.status === "erro" || (data.processados && data.processados.some(r => !r.sucesso))) {
+      const erro = data.detalhes ? data.detalhes[0].mensagem : "Ocorreu um erro no upload";
+      mostrarMensagem('erro', `❌ Erro: ${erro}`);
+    } else {
+      mostrarMensagem('sucesso', "✅ Upload concluído com sucesso!");
+    }
+    if (data.job_id) adicionarLinksExportacao(data.job_id);
+  }
+
+  // Links para baixar o resultado completo, linha a linha
+  function adicionarLinksExportacao(jobId) {
+    ['xlsx', 'csv'].forEach(formato => {
+      const link = document.createElement('a');
+      link.href = `/patrimonio/jobs/${encodeURIComponent(jobId)}/export?formato=${formato}`;
+      link.textContent = ` ⬇ Resultado (${formato.toUpperCase()})`;
+      mensagemEl.appendChild(link);
+    });
+  }
+
+  // Monta o FormData do upload; devolve null se o produto digitado não foi selecionado
+  function montarFormData() {
     const fd = new FormData(form);
-    fd.set('id_produto', selectedId);
 
+    // Produto em branco = upload em lote (produto vem da planilha)
+    if (!inputProduto.value.trim()) {
+      fd.delete('id_produto');
+    } else if (selectedId) {
+      fd.set('id_produto', selectedId);
+    } else {
+      mostrarMensagem('erro', "❌ Selecione um produto da lista ou deixe em branco para enviar em lote");
+      return null;
+    }
+    return fd;
+  }
+
+  async function enviar(url, fd, aoReceber) {
     mensagemEl.style.display = 'none';
     loadingEl.style.display = 'block';
 
     try {
-      const res = await fetch('/patrimonio/upload', { method: 'POST', body: fd });
+      const res = await fetch(url, { method: 'POST', body: fd });
       const data = await res.json();
       loadingEl.style.display = 'none';
-
-      if (data.status === "erro" || (data.processados && data.processados.some(r => !r.sucesso))) {
-        const erro = data.detalhes ? data.detalhes[0].mensagem : "Ocorreu um erro no upload";
-        mensagemEl.className = 'erro';
-        mensagemEl.style.display = 'block';
-        mensagemEl.textContent = `❌ Erro: ${erro}`;
-      } else {
-        mensagemEl.className = 'sucesso';
-        mensagemEl.style.display = 'block';
-        mensagemEl.textContent = "✅ Upload concluído com sucesso!";
-      }
+      aoReceber(data);
     } catch (err) {
       loadingEl.style.display = 'none';
-      mensagemEl.className = 'erro';
-      mensagemEl.style.display = 'block';
-      mensagemEl.textContent = "❌ Erro na comunicação com o servidor";
+      mostrarMensagem('erro', "❌ Erro na comunicação com o servidor");
     }
+  }
+
+  // ----------------- Submit -----------------
+  form.addEventListener('submit', async (e) => {
+    e.preventDefault();
+    const fd = montarFormData();
+    if (fd) await enviar('/patrimonio/upload', fd, mostrarResultado);
   });
 
+  // ----------------- Simulação (dry-run) -----------------
+  if (simularBtn) {
+    simularBtn.addEventListener('click', async () => {
+      if (!form.reportValidity()) return;
+      const fd = montarFormData();
+      if (!fd) return;
+      fd.set('dry_run', 'true');
+
+      await enviar('/patrimonio/upload', fd, (data) => {
+        if (data.status !== "sucesso") {
+          mostrarResultado(data);
+          return;
+        }
+
+        const minutos = Math.round(data.expira_em_segundos / 60);
+        mostrarMensagem('sucesso',
+          `🔎 Simulação OK: ${data.total_linhas} linha(s) prontas` +
+          (data.sem_patrimonio ? `, ${data.sem_patrimonio} sem patrimônio` : '') +
+          `. Confirme em até ${minutos} min. `);
+
+        const confirmarBtn = document.createElement('button');
+        confirmarBtn.type = 'button';
+        confirmarBtn.textContent = 'Confirmar envio';
+        confirmarBtn.addEventListener('click', async () => {
+          const fdConfirmar = new FormData();
+          fdConfirmar.set('token', data.token);
+          await enviar('/patrimonio/upload/confirmar', fdConfirmar, mostrarResultado);
+        });
+        mensagemEl.appendChild(confirmarBtn);
+      });
+    });
+  }
+
   inputFile.addEventListener('change', () => {
   if (inputFile.files.length > 0) {
     fileNameEl.textContent = inputFile.files[0].name;